@@ -1,14 +1,25 @@
 #!/usr/bin/env python3
+import argparse
+import atexit
+import ctypes
+import ctypes.util
+import os
+import select
 import threading
 import time
 import platform
 import logging
 import json
+import struct
+from collections import OrderedDict, deque, namedtuple
+from collections.abc import Mapping
+from multiprocessing import shared_memory
 from pathlib import Path
 
 import cv2
+import numpy as np
 import pyvirtualcam
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request
 
 # ==========================
 # Paths & logging
@@ -27,6 +38,31 @@ logging.basicConfig(
 )
 log = logging.getLogger("facecam")
 
+
+class LogThrottle:
+    """Let a repeating log message through at most once per `interval` seconds.
+
+    Suppressed occurrences are counted and reported with the next message
+    that gets through.
+    """
+
+    def __init__(self, interval=5.0):
+        self.interval = interval
+        self._next = 0.0
+        self._suppressed = 0
+
+    def __call__(self, level, msg, *args):
+        now = time.monotonic()
+        if now < self._next:
+            self._suppressed += 1
+            return
+        if self._suppressed:
+            msg += " (%d similar messages suppressed)"
+            args += (self._suppressed,)
+        log.log(level, msg, *args)
+        self._next = now + self.interval
+        self._suppressed = 0
+
 # ==========================
 # Global config (shared state)
 # ==========================
@@ -37,13 +73,118 @@ config = {
     "detection_every_n_frames": 10, # defaults tuned for less jitter
     "smoothing_alpha": 0.02,
     "margin_factor": 2.8,
+    "detection_width": 320,         # px width face detection runs at; 0 = full frame
+    "async_detection": True,        # detect on a background thread, never stall output
+    "roi_detection": True,          # search around the last face before scanning the full frame
+    "roi_max_misses": 3,            # full-frame scan after this many empty ROI scans in a row
+    "roi_full_scan_every": 15,      # ...and at least every this many detections
+    "tracker": "lk",                # per-frame tracker between detections, see TRACKERS
+    "detector": "haar",             # "haar", "lbp", "yunet", "ssd"
+    "detector_params": {},          # per-backend overrides, e.g. {"haar": {"min_neighbors": 4}}
+    "camera_max_index": 10,         # probe camera indices below this
+    "source": "camera",             # "camera", "file", "images", "synthetic"
+    "source_path": None,            # video file or image directory for file/images
+    "capture_modes": {},            # negotiated capture mode per device, see capture_device_key
+    "low_latency": True,            # 1-frame driver buffer, drop queued frames, keep only the newest
+    "mirror": False,                # flip the output horizontally
+    "output_format": "auto",        # sink pixel format, see OUTPUT_FORMATS; "auto" = sink's native
+    "output_width": 640,            # output frame size; changing it reopens the sink
+    "output_height": 640,
+    "output_fps": 30,
 }
 
+# Defaults for code that runs without a config (sinks, bench helpers); the
+# frame loop uses the output_* config fields.
 OUT_W, OUT_H = 640, 640
 FPS = 30
+OUTPUT_SIZE_RANGE = (160, 1920)  # px per side; sizes are rounded to even for YUV formats
+OUTPUT_FPS_RANGE = (5, 60)
 
 app = Flask(__name__)
 
+# ==========================
+# Config snapshots
+# ==========================
+class ConfigSnapshot(Mapping):
+    """Immutable, versioned view of the config.
+
+    update_config() publishes a new snapshot by swapping the module-level
+    reference, so readers (the frame loop, GET /api/config) never take
+    config_lock. Hot-path values are parsed once per version into typed
+    attributes, and the JSON served by the API is serialized once as well.
+    The snapshot is still a read-only Mapping of the raw config values.
+    """
+
+    __slots__ = (
+        "version", "_values", "json_bytes",
+        "orientation", "detection_every_n_frames", "smoothing_alpha", "margin_factor",
+        "detection_width", "async_detection", "roi_detection", "roi_max_misses",
+        "roi_full_scan_every", "tracker", "detector_spec", "low_latency", "mirror",
+        "output_size", "output_fps",
+    )
+
+    def __init__(self, values, version=0):
+        values = dict(values)
+        init = object.__setattr__
+        init(self, "version", version)
+        init(self, "_values", values)
+        init(self, "json_bytes", json.dumps(values).encode("utf-8"))
+        init(self, "orientation", values.get("orientation", "none"))
+        init(self, "detection_every_n_frames", max(1, int(values["detection_every_n_frames"])))
+        init(self, "smoothing_alpha", float(values["smoothing_alpha"]))
+        init(self, "margin_factor", float(values["margin_factor"]))
+        init(self, "detection_width", int(values["detection_width"]))
+        init(self, "async_detection", bool(values.get("async_detection")))
+        init(self, "roi_detection", bool(values.get("roi_detection")))
+        init(self, "roi_max_misses", int(values["roi_max_misses"]))
+        init(self, "roi_full_scan_every", int(values["roi_full_scan_every"]))
+        init(self, "tracker", values.get("tracker") or "none")
+        init(self, "detector_spec", detector_spec(values))
+        init(self, "low_latency", bool(values.get("low_latency")))
+        init(self, "mirror", bool(values.get("mirror")))
+        init(self, "output_size", (
+            int(values.get("output_width", OUT_W)), int(values.get("output_height", OUT_H))
+        ))
+        init(self, "output_fps", float(values.get("output_fps", FPS)))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("ConfigSnapshot is immutable")
+
+    def __getitem__(self, key):
+        return self._values[key]
+
+    def __iter__(self):
+        return iter(self._values)
+
+    def __len__(self):
+        return len(self._values)
+
+    def replace(self, **changes):
+        """Return an unpublished copy with `changes` applied (same version)."""
+        return ConfigSnapshot(dict(self._values, **changes), self.version)
+
+
+def detector_spec(cfg):
+    """Return a hashable (name, params) key for the configured detector."""
+    name = cfg.get("detector", "haar")
+    params = (cfg.get("detector_params") or {}).get(name, {})
+    return name, tuple(sorted(params.items()))
+
+
+_config_snapshot = ConfigSnapshot(config)
+
+
+def _publish_config_locked():
+    """Publish a new snapshot of `config`; caller holds config_lock."""
+    global _config_snapshot
+    _config_snapshot = ConfigSnapshot(config, _config_snapshot.version + 1)
+
+
+def get_config_snapshot():
+    """Current ConfigSnapshot; lock-free (a single reference read)."""
+    return _config_snapshot
+
+
 # ==========================
 # Config persistence
 # ==========================
@@ -60,28 +201,95 @@ def load_persisted_config():
         for k, v in data.items():
             if k in config:
                 config[k] = v
-
-        # Safety: on Linux, never persist camera_index==0 as input
-        if platform.system() == "Linux" and config.get("camera_index") == 0:
-            log.info("Resetting persisted camera_index=0 on Linux (loopback).")
-            config["camera_index"] = None
+        _publish_config_locked()
 
     log.info("Loaded persisted config from %s: %s", CONFIG_FILE, data)
 
 
-def persist_config():
-    with config_lock:
-        data = dict(config)
+def persist_config(snapshot=None):
+    """Write `snapshot` (default: the current config) to CONFIG_FILE atomically.
+
+    The JSON goes to a temp file in the same directory, is fsynced, and then
+    renamed over CONFIG_FILE, so readers never see a partial file.
+    """
+    data = dict(snapshot if snapshot is not None else get_config_snapshot())
+    tmp = CONFIG_FILE.with_name(CONFIG_FILE.name + ".tmp")
     try:
-        CONFIG_FILE.write_text(json.dumps(data, indent=2), encoding="utf-8")
+        with open(tmp, "w", encoding="utf-8") as fh:
+            fh.write(json.dumps(data, indent=2))
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp, CONFIG_FILE)
         log.debug("Persisted config to %s: %s", CONFIG_FILE, data)
     except Exception as e:
         log.warning("Failed to write config file %s: %s", CONFIG_FILE, e)
 
 
+PERSIST_INTERVAL = 0.5  # seconds; config is written at most this often
+
+
+class ConfigPersister:
+    """Coalesce config writes onto a background thread.
+
+    schedule() only marks the config dirty. The writer thread persists the
+    newest snapshot at most once per `interval`, so dragging a slider results
+    in a handful of writes rather than one per event. flush() writes any
+    pending change immediately; it runs at interpreter exit. The file is
+    written outside `_cond`, so schedule() never waits for the disk.
+    """
+
+    def __init__(self, interval=PERSIST_INTERVAL):
+        self.interval = interval
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()  # serializes writers
+        self._dirty = False
+        self._thread = None
+        self._last_write = 0.0
+        self._written_version = None
+
+    def schedule(self):
+        with self._cond:
+            self._dirty = True
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, daemon=True, name="ConfigPersister"
+                )
+                self._thread.start()
+            self._cond.notify_all()
+
+    def _write(self):
+        # Caller must not hold self._cond.
+        with self._write_lock:
+            with self._cond:
+                self._dirty = False
+            snapshot = get_config_snapshot()
+            if snapshot.version != self._written_version:
+                persist_config(snapshot)
+                self._written_version = snapshot.version
+            with self._cond:
+                self._last_write = time.monotonic()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._dirty)
+                delay = self._last_write + self.interval - time.monotonic()
+                if delay > 0:
+                    self._cond.wait(delay)
+                    continue
+            self._write()
+
+    def flush(self):
+        # Waits for a write in flight, then writes any newer version.
+        self._write()
+
+
+config_persister = ConfigPersister()
+atexit.register(config_persister.flush)
+
+
 def get_config():
-    with config_lock:
-        return dict(config)
+    return dict(get_config_snapshot())
 
 
 def update_config(changes: dict):
@@ -89,59 +297,656 @@ def update_config(changes: dict):
         for k, v in changes.items():
             if k in config:
                 config[k] = v
+        _publish_config_locked()
     log.info("Config updated: %s", changes)
-    persist_config()
+    config_persister.schedule()
+    config_events.publish("config", get_config_snapshot().json_bytes)
 
 
 # Load config once at startup
 load_persisted_config()
 
+# ==========================
+# Metrics (shared state)
+# ==========================
+metrics_lock = threading.Lock()
+metrics = {}
+
+
+def set_metrics(values: dict):
+    with metrics_lock:
+        metrics.update(values)
+
+
+def get_metrics():
+    with metrics_lock:
+        return dict(metrics)
+
+
+# ==========================
+# Event stream (server-sent events)
+# ==========================
+EVENT_METRICS_INTERVAL = 1.0  # seconds between metrics pushes per client
+
+
+class EventSubscriber:
+    """One connected client. Only the newest payload per event name is kept,
+    so a slow client gets the latest state instead of a growing backlog."""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._pending = {}
+
+    def put(self, event, data):
+        with self._cond:
+            self._pending[event] = data
+            self._cond.notify_all()
+
+    def take(self, timeout):
+        with self._cond:
+            self._cond.wait_for(lambda: self._pending, timeout)
+            pending, self._pending = self._pending, {}
+            return pending
+
+
+class EventBroadcaster:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = set()
+
+    def subscribe(self):
+        sub = EventSubscriber()
+        with self._lock:
+            self._subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            self._subscribers.discard(sub)
+
+    def publish(self, event, data):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for sub in subscribers:
+            sub.put(event, data)
+
+
+config_events = EventBroadcaster()
+
+
+def format_sse(event, data):
+    if isinstance(data, bytes):
+        data = data.decode("utf-8")
+    return f"event: {event}\ndata: {data}\n\n"
+
+
 # ==========================
 # Camera probing
 # ==========================
-def list_cameras(max_index=10):
+SYSFS_V4L_ROOT = Path("/sys/class/video4linux")
+DEV_ROOT = Path("/dev")
+
+# struct v4l2_capability: driver[16] card[32] bus_info[32] version
+# capabilities device_caps reserved[3]
+V4L2_CAPABILITY = struct.Struct("<16s32s32sIII12x")
+VIDIOC_QUERYCAP = (2 << 30) | (V4L2_CAPABILITY.size << 16) | (ord("V") << 8) | 0
+V4L2_CAP_VIDEO_CAPTURE = 0x00000001
+V4L2_CAP_VIDEO_OUTPUT = 0x00000002
+V4L2_CAP_VIDEO_CAPTURE_MPLANE = 0x00001000
+V4L2_CAP_DEVICE_CAPS = 0x80000000
+LOOPBACK_DRIVERS = ("v4l2 loopback", "v4l2loopback")
+
+
+def query_v4l2_caps(dev_path):
+    """VIDIOC_QUERYCAP on a V4L2 device node, without streaming.
+
+    Returns {"driver", "card", "caps"} or None if the node can't be queried.
+    Opening with O_NONBLOCK and only querying capabilities doesn't disturb a
+    device that another process is streaming from.
+    """
+    try:
+        import fcntl
+        fd = os.open(str(dev_path), os.O_RDWR | os.O_NONBLOCK)
+    except (ImportError, OSError):
+        return None
+    try:
+        buf = bytearray(V4L2_CAPABILITY.size)
+        fcntl.ioctl(fd, VIDIOC_QUERYCAP, buf)
+    except OSError:
+        return None
+    finally:
+        os.close(fd)
+    driver, card, _, _, capabilities, device_caps = V4L2_CAPABILITY.unpack(bytes(buf))
+    caps = device_caps if capabilities & V4L2_CAP_DEVICE_CAPS else capabilities
+    return {
+        "driver": driver.split(b"\0", 1)[0].decode("utf-8", "replace"),
+        "card": card.split(b"\0", 1)[0].decode("utf-8", "replace"),
+        "caps": caps,
+    }
+
+
+def enumerate_v4l2_devices(sysfs_root=SYSFS_V4L_ROOT, dev_root=DEV_ROOT, querycap=query_v4l2_caps):
+    """List V4L2 devices from sysfs (plus QUERYCAP) without opening streams.
+
+    Returns [{"index", "name", "driver", "capture", "loopback"}] sorted by
+    index. When QUERYCAP isn't available (e.g. a fake sysfs tree in tests),
+    the driver comes from the sysfs driver symlink and a node counts as a
+    capture node if its sysfs "index" attribute is 0 (UVC cameras expose a
+    second, metadata-only node with index 1).
+    """
+    sysfs_root = Path(sysfs_root)
+    devices = []
+    for entry in sysfs_root.glob("video*"):
+        try:
+            index = int(entry.name[len("video"):])
+        except ValueError:
+            continue
+
+        def read_attr(name, default=""):
+            try:
+                return (entry / name).read_text(encoding="utf-8").strip()
+            except OSError:
+                return default
+
+        name = read_attr("name") or f"Camera {index}"
+        driver_link = entry / "device" / "driver"
+        driver = Path(os.path.realpath(driver_link)).name if driver_link.exists() else ""
+
+        info = querycap(Path(dev_root) / entry.name)
+        if info is not None:
+            driver = info["driver"] or driver
+            caps = info["caps"]
+            capture = bool(caps & (V4L2_CAP_VIDEO_CAPTURE | V4L2_CAP_VIDEO_CAPTURE_MPLANE))
+            output = bool(caps & V4L2_CAP_VIDEO_OUTPUT)
+        else:
+            capture = read_attr("index", "0") == "0"
+            output = False
+
+        loopback = driver in LOOPBACK_DRIVERS or (output and "loopback" in driver)
+        devices.append({
+            "index": index,
+            "name": name,
+            "driver": driver,
+            "capture": capture,
+            "loopback": loopback,
+        })
+    devices.sort(key=lambda d: d["index"])
+    return devices
+
+
+def find_loopback_device(sysfs_root=SYSFS_V4L_ROOT, dev_root=DEV_ROOT, querycap=query_v4l2_caps):
+    """Path of the first v4l2loopback device, or None if there is none."""
+    if not Path(sysfs_root).is_dir():
+        return None
+    for dev in enumerate_v4l2_devices(sysfs_root, dev_root, querycap):
+        if dev["loopback"]:
+            return str(Path(dev_root) / f"video{dev['index']}")
+    return None
+
+
+def forget_loopback_camera_index(sysfs_root=SYSFS_V4L_ROOT, dev_root=DEV_ROOT,
+                                 querycap=query_v4l2_caps):
+    """Drop a persisted camera_index 0 that is the loopback output, not a camera.
+
+    Only applies on Linux. Without sysfs, index 0 is assumed to be the
+    loopback (its usual number); otherwise sysfs decides, so a real camera
+    at index 0 (e.g. v4l2loopback loaded with video_nr=4) stays selected.
+    """
+    if platform.system() != "Linux" or get_config_snapshot().get("camera_index") != 0:
+        return
+    if Path(sysfs_root).is_dir() and not any(
+        d["index"] == 0 and d["loopback"]
+        for d in enumerate_v4l2_devices(sysfs_root, dev_root, querycap)
+    ):
+        return
+    log.info("Resetting persisted camera_index=0 on Linux (loopback).")
+    update_config({"camera_index": None})
+
+
+CAMERA_PROBE_WORKERS = 4      # devices probed at the same time
+CAMERA_PROBE_TIMEOUT = 3.0    # seconds before a device probe is abandoned
+CAMERA_RESULT_TTL = 60.0      # seconds a per-device probe result is reused
+
+_device_probe_lock = threading.Lock()
+_device_probes = {}   # index -> {"usable", "latency_ms", "timed_out", "probed_at"}
+_hung_probes = set()  # indices whose abandoned probe thread hasn't returned yet
+
+
+def probe_camera(index):
+    """Open camera `index` and read one frame; True if it works as an input."""
+    cap = cv2.VideoCapture(index)
+    try:
+        if not cap.isOpened():
+            return False
+        ret, _ = cap.read()
+        if ret:
+            log.debug("Camera index %d is usable", index)
+        else:
+            log.debug("Camera index %d opened but failed to read frame", index)
+        return ret
+    finally:
+        cap.release()
+
+
+def probe_cameras(indices, timeout=CAMERA_PROBE_TIMEOUT, workers=CAMERA_PROBE_WORKERS):
+    """Probe `indices` concurrently, at most `workers` at a time.
+
+    A probe still running after `timeout` seconds is abandoned (its daemon
+    thread is left to finish on its own) and reported as timed out, so one
+    misbehaving device can't hold up the others. Returns {index: result}.
+    """
+    cond = threading.Condition()
+    finished = {}
+
+    def work(i):
+        start = time.monotonic()
+        try:
+            usable = probe_camera(i)
+        except Exception:
+            log.exception("Probing camera index %d failed", i)
+            usable = False
+        with cond:
+            finished[i] = (usable, time.monotonic() - start)
+            cond.notify_all()
+        with _device_probe_lock:
+            _hung_probes.discard(i)
+
+    pending = list(indices)
+    running = {}  # index -> start time
+    results = {}
+    with cond:
+        while pending or running:
+            while pending and len(running) < workers:
+                i = pending.pop(0)
+                running[i] = time.monotonic()
+                threading.Thread(target=work, args=(i,), daemon=True, name=f"CameraProbe{i}").start()
+
+            now = time.monotonic()
+            for i, started in list(running.items()):
+                if i in finished:
+                    usable, latency = finished[i]
+                    results[i] = {"usable": usable, "latency_ms": latency * 1000.0, "timed_out": False}
+                    del running[i]
+                elif now - started >= timeout:
+                    log.warning("Camera index %d did not answer within %.1fs, skipping it", i, timeout)
+                    with _device_probe_lock:
+                        _hung_probes.add(i)
+                    results[i] = {"usable": False, "latency_ms": timeout * 1000.0, "timed_out": True}
+                    del running[i]
+
+            if running and not (pending and len(running) < workers):
+                deadline = min(running.values()) + timeout
+                cond.wait(max(0.0, deadline - time.monotonic()))
+    return results
+
+
+def sysfs_probe_record(dev, latency_ms, probed_at):
+    """_device_probes entry for a device found through enumerate_v4l2_devices()."""
+    return {
+        "usable": dev["capture"] and not dev["loopback"],
+        "latency_ms": latency_ms,
+        "timed_out": False,
+        "name": dev["name"],
+        "driver": dev["driver"],
+        "loopback": dev["loopback"],
+        "probed_at": probed_at,
+    }
+
+
+def list_cameras_sysfs(current_idx, max_index, sysfs_root=SYSFS_V4L_ROOT, dev_root=DEV_ROOT):
+    """Capture-capable, non-loopback V4L2 devices, found without streaming."""
+    start = time.monotonic()
+    devices = enumerate_v4l2_devices(sysfs_root, dev_root)
+    latency_ms = (time.monotonic() - start) * 1000.0
+
+    cams = []
+    with _device_probe_lock:
+        _device_probes.clear()
+        for dev in devices:
+            i = dev["index"]
+            if i >= max_index:
+                continue
+            _device_probes[i] = sysfs_probe_record(dev, latency_ms, start)
+            if _device_probes[i]["usable"]:
+                cams.append(i)
+
+    if current_idx is not None and current_idx not in cams:
+        cams.append(current_idx)
+    log.info("Detected cameras (sysfs): %s", cams)
+    return cams
+
+
+def camera_name(index):
+    """Device name from the last enumeration, if known."""
+    with _device_probe_lock:
+        return _device_probes.get(index, {}).get("name")
+
+
+def capture_device_key(index):
+    """Key for per-device settings: the index plus the device name when known,
+    so a different camera showing up at the same index is not confused with it."""
+    name = camera_name(index)
+    return f"{index}:{name}" if name else str(index)
+
+
+def camera_probe_details():
+    """Per-device results of the most recent probes, for the API."""
+    with _device_probe_lock:
+        return {
+            str(i): {k: v for k, v in r.items() if k != "probed_at"}
+            for i, r in sorted(_device_probes.items())
+        }
+
+
+def list_cameras(max_index=None, use_cache=True):
     """Probe camera indices and return those that work as *inputs*.
 
-    On Linux we skip index 0 because it's our v4l2loopback virtual cam (FaceCam).
+    On Linux with sysfs, devices are enumerated without opening them (see
+    list_cameras_sysfs); the probing below is the fallback for other OSes.
+
+    Without sysfs on Linux we skip index 0 because it's our v4l2loopback virtual cam (FaceCam).
     We ALWAYS include the currently selected camera_index (if set), even if the
     device is already in use by our own camera_loop.
+
+    Indices are probed in parallel (see probe_cameras). Per-device results
+    are reused for CAMERA_RESULT_TTL seconds unless `use_cache` is False, and
+    a device whose earlier probe is still hung is not probed again.
     """
     cfg = get_config()
     current_idx = cfg.get("camera_index")
+    if max_index is None:
+        max_index = int(cfg.get("camera_max_index", 10))
+
+    if platform.system() == "Linux" and SYSFS_V4L_ROOT.is_dir():
+        return list_cameras_sysfs(current_idx, max_index)
 
-    cams = []
     start = 0
     if platform.system() == "Linux":
         start = 1  # /dev/video0 is FaceCam output; don't use as input
 
     log.debug("Probing cameras %d..%d (current_idx=%s)", start, max_index - 1, current_idx)
 
-    for i in range(start, max_index):
-        # If this is the camera our own loop is already using, assume it's valid.
-        if current_idx is not None and i == current_idx:
-            if i not in cams:
-                cams.append(i)
-                log.debug("Camera index %d assumed usable (current capture)", i)
-            continue
+    now = time.monotonic()
+    to_probe = []
+    with _device_probe_lock:
+        for i in range(start, max_index):
+            # If this is the camera our own loop is already using, assume it's valid.
+            if current_idx is not None and i == current_idx:
+                continue
+            if i in _hung_probes:
+                continue
+            cached = _device_probes.get(i)
+            if use_cache and cached and now - cached["probed_at"] < CAMERA_RESULT_TTL:
+                continue
+            to_probe.append(i)
 
-        cap = cv2.VideoCapture(i)
-        if cap.isOpened():
-            ret, _ = cap.read()
-            if ret:
-                cams.append(i)
-                log.debug("Camera index %d is usable", i)
-            else:
-                log.debug("Camera index %d opened but failed to read frame", i)
-        cap.release()
+    results = probe_cameras(to_probe)
+    with _device_probe_lock:
+        for i, result in results.items():
+            _device_probes[i] = dict(result, probed_at=now)
+        for i in list(_device_probes):
+            if i >= max_index:
+                del _device_probes[i]
+        cams = [
+            i for i in range(start, max_index)
+            if i in _device_probes and _device_probes[i]["usable"] and i not in _hung_probes
+        ]
 
-    # Safety: if current_idx is set but wasn't added above for some reason, add it.
+    # Safety: if current_idx is set but wasn't found above (e.g. it's busy in our own loop), add it.
     if current_idx is not None and current_idx not in cams:
         cams.append(current_idx)
-        log.debug("Camera index %d added from config even though probing failed", current_idx)
+        log.debug("Camera index %d assumed usable (current capture)", current_idx)
 
     log.info("Detected cameras: %s", cams)
     return cams
 
+CAMERA_CACHE_TTL = 30.0  # seconds before a cached camera list is re-probed
+CAMERA_PROBE_WAIT = 15.0  # longest an HTTP request waits for a running probe
+
+
+class CameraRegistry:
+    """Cached camera list with single-flight, background probing.
+
+    cameras() returns the cached list at once and, when it is older than
+    `ttl`, kicks off a re-probe in the background (stale-while-revalidate).
+    However many callers ask for a probe at the same time, only one runs;
+    everyone else waits for (or just reads) its result.
+    """
+
+    def __init__(self, probe=list_cameras, ttl=CAMERA_CACHE_TTL):
+        self.probe = probe
+        self.ttl = ttl
+        self._cond = threading.Condition()
+        self._cameras = []
+        self._probing = False
+        self._probed_at = None        # time.time() of the last finished probe
+        self._probed_mono = None      # same, monotonic clock, for the TTL
+        self._duration = None
+        self._error = None
+
+    def _run_probe(self, force):
+        start = time.monotonic()
+        try:
+            cams, error = self.probe(use_cache=not force), None
+        except Exception as e:
+            log.exception("Camera probe failed")
+            cams, error = None, str(e)
+        with self._cond:
+            if cams is not None:
+                self._cameras = cams
+            self._error = error
+            self._probed_at = time.time()
+            self._probed_mono = time.monotonic()
+            self._duration = self._probed_mono - start
+            self._probing = False
+            self._cond.notify_all()
+
+    def refresh(self, wait=False, timeout=None, force=False):
+        """Start a probe unless one is running; optionally wait for it.
+
+        `force` re-probes every device instead of reusing recent per-device results.
+        """
+        with self._cond:
+            if not self._probing:
+                self._probing = True
+                threading.Thread(
+                    target=self._run_probe, args=(force,), daemon=True, name="CameraProbe"
+                ).start()
+            if wait:
+                self._cond.wait_for(lambda: not self._probing, timeout)
+
+    def cameras(self, wait_first=None):
+        """Return the cached list, refreshing it in the background if stale.
+
+        `wait_first` (seconds) blocks until the very first probe finishes, so
+        the first caller doesn't get an empty list just because nothing has
+        been probed yet.
+        """
+        with self._cond:
+            stale = self._probed_mono is None or time.monotonic() - self._probed_mono > self.ttl
+        if stale:
+            self.refresh(wait=wait_first is not None and self._probed_mono is None, timeout=wait_first)
+        with self._cond:
+            return list(self._cameras)
+
+    def status(self):
+        with self._cond:
+            return {
+                "status": "probing" if self._probing else ("error" if self._error else "idle"),
+                "last_probe": self._probed_at,
+                "duration_ms": self._duration * 1000.0 if self._duration is not None else None,
+                "error": self._error,
+                "devices": camera_probe_details(),
+            }
+
+    def update_devices(self, added, removed):
+        """Incrementally apply hotplug changes instead of re-probing everything."""
+        with _device_probe_lock:
+            for i in removed:
+                _device_probes.pop(i, None)
+        usable = set(check_cameras(sorted(added))) if added else set()
+        with self._cond:
+            cams = [i for i in self._cameras if i not in removed and i not in added]
+            cams.extend(usable)
+            self._cameras = sorted(cams)
+            return list(self._cameras)
+
+
+camera_registry = CameraRegistry()
+
+# ==========================
+# Camera hotplug
+# ==========================
+HOTPLUG_POLL_INTERVAL = 1.0  # seconds, polling fallback when inotify is unavailable
+HOTPLUG_SETTLE = 0.3         # seconds to let udev finish setting up a new node
+
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+INOTIFY_EVENT = struct.Struct("iIII")
+
+# Set when the selected camera reappears; camera_loop then reopens it.
+camera_reconnect = threading.Event()
+
+
+def check_cameras(indices, sysfs_root=SYSFS_V4L_ROOT, dev_root=DEV_ROOT):
+    """Which of `indices` are usable inputs, checked as cheaply as possible.
+
+    Like a full listing, records what was found in _device_probes, so the
+    device name (part of capture_device_key) survives a replug.
+    """
+    if platform.system() == "Linux" and Path(sysfs_root).is_dir():
+        wanted = set(indices)
+        start = time.monotonic()
+        devices = [d for d in enumerate_v4l2_devices(sysfs_root, dev_root) if d["index"] in wanted]
+        latency_ms = (time.monotonic() - start) * 1000.0
+        with _device_probe_lock:
+            for dev in devices:
+                _device_probes[dev["index"]] = sysfs_probe_record(dev, latency_ms, start)
+        return [d["index"] for d in devices if d["capture"] and not d["loopback"]]
+    results = probe_cameras(indices)
+    return [i for i, r in results.items() if r["usable"]]
+
+
+def list_video_nodes(dev_root):
+    """Indices of the video* nodes currently in `dev_root`."""
+    nodes = set()
+    try:
+        for entry in os.scandir(dev_root):
+            if entry.name.startswith("video"):
+                try:
+                    nodes.add(int(entry.name[len("video"):]))
+                except ValueError:
+                    pass
+    except OSError:
+        pass
+    return nodes
+
+
+class DeviceWatcher:
+    """Watch a directory (normally /dev) for video* nodes coming and going.
+
+    Uses inotify through libc when available and falls back to polling the
+    directory listing. Events are only used as a trigger: the listing is
+    re-read and diffed, and on_change(added, removed) is called with sets of
+    indices whenever it changed.
+    """
+
+    def __init__(self, on_change, dev_root=DEV_ROOT, poll_interval=HOTPLUG_POLL_INTERVAL):
+        self.on_change = on_change
+        self.dev_root = str(dev_root)
+        self.poll_interval = poll_interval
+        self.mode = None
+        self._known = list_video_nodes(self.dev_root)
+        self._running = False
+        self._thread = None
+        self._libc = None
+        self._fd = None
+
+    def _init_inotify(self):
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+            fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        except (OSError, AttributeError):
+            return False
+        if fd < 0:
+            return False
+        mask = IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO
+        if libc.inotify_add_watch(fd, self.dev_root.encode(), mask) < 0:
+            os.close(fd)
+            return False
+        self._libc, self._fd = libc, fd
+        return True
+
+    def start(self):
+        self.mode = "inotify" if self._init_inotify() else "poll"
+        log.info("Watching %s for camera hotplug (%s)", self.dev_root, self.mode)
+        self._running = True
+        target = self._run_inotify if self.mode == "inotify" else self._run_poll
+        self._thread = threading.Thread(target=target, daemon=True, name="HotplugWatcher")
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(max(1.0, self.poll_interval * 2))
+            self._thread = None
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def rescan(self):
+        current = list_video_nodes(self.dev_root)
+        added, removed = current - self._known, self._known - current
+        self._known = current
+        if added or removed:
+            try:
+                self.on_change(added, removed)
+            except Exception:
+                log.exception("Hotplug handler failed")
+
+    def _run_poll(self):
+        while self._running:
+            time.sleep(self.poll_interval)
+            self.rescan()
+
+    def _run_inotify(self):
+        while self._running:
+            ready, _, _ = select.select([self._fd], [], [], 0.5)
+            if not ready:
+                continue
+            relevant = False
+            try:
+                data = os.read(self._fd, 4096)
+            except BlockingIOError:
+                continue
+            offset = 0
+            while offset + INOTIFY_EVENT.size <= len(data):
+                _, _, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+                name = data[offset + INOTIFY_EVENT.size:offset + INOTIFY_EVENT.size + length]
+                offset += INOTIFY_EVENT.size + length
+                if name.startswith(b"video"):
+                    relevant = True
+            if relevant:
+                time.sleep(HOTPLUG_SETTLE)
+                self.rescan()
+
+
+def handle_hotplug(added, removed):
+    log.info("Camera hotplug: added=%s removed=%s", sorted(added), sorted(removed))
+    cams = camera_registry.update_devices(added, removed)
+    config_events.publish("cameras", json.dumps(cams))
+    current_idx = get_config_snapshot().get("camera_index")
+    if current_idx in removed:
+        log.warning("Selected camera index %s was unplugged", current_idx)
+    if current_idx in added:
+        log.info("Selected camera index %s is back, reconnecting", current_idx)
+        camera_reconnect.set()
+
 # ==========================
 # Flask API + UI
 # ==========================
@@ -212,6 +1017,7 @@ INDEX_HTML = """<!DOCTYPE html>
 </head>
 <body>
   <h1>FaceCam Controls</h1>
+  <div class="note" id="status">Connecting...</div>
 
   <div class="section">
     <h2>1. Camera</h2>
@@ -229,6 +1035,7 @@ INDEX_HTML = """<!DOCTYPE html>
       <button data-orient="cw">90° clockwise</button>
       <button data-orient="ccw">90° counter-clockwise</button>
     </div>
+    <label><input type="checkbox" id="mirror-checkbox"> Mirror output</label>
     <div class="note">Match this to how your camera/phone is physically oriented.</div>
   </div>
 
@@ -262,7 +1069,67 @@ INDEX_HTML = """<!DOCTYPE html>
       </label>
       <input type="range" id="margin-slider" min="1.5" max="3.5" step="0.1" />
       <div class="note">Higher = looser framing, moves less when you move.</div>
+      <br>
     </div>
+
+    <div class="slider-group">
+      <label>
+        Detection width
+        <span class="value" id="detwidth-label"></span>
+      </label>
+      <input type="range" id="detwidth-slider" min="0" max="960" step="40" />
+      <div class="note">Width (px) the face detector works at. Lower = less CPU, may miss small faces. 0 = full frame.</div>
+      <br>
+    </div>
+
+    <div class="slider-group">
+      <label>
+        Face detector
+        <select id="detector-select"></select>
+      </label>
+      <div class="note">LBP is faster than Haar; YuNet / SSD are more accurate but need model files in <code>models/</code>.</div>
+      <br>
+    </div>
+
+    <div class="slider-group">
+      <label>
+        Tracker between detections
+        <select id="tracker-select">
+          <option value="none">None</option>
+          <option value="lk">Optical flow (LK)</option>
+          <option value="mil">MIL</option>
+          <option value="kcf">KCF (contrib)</option>
+          <option value="mosse">MOSSE (contrib)</option>
+          <option value="csrt">CSRT (contrib)</option>
+        </select>
+      </label>
+      <div class="note">Follows your face on every frame between detections, so framing reacts faster without more detection CPU.</div>
+    </div>
+  </div>
+
+  <div class="section">
+    <h2>4. Output</h2>
+    <label>
+      Size
+      <select id="output-size-select">
+        <option value="480x480">480 × 480</option>
+        <option value="640x640">640 × 640</option>
+        <option value="720x720">720 × 720</option>
+        <option value="1080x1080">1080 × 1080</option>
+        <option value="1280x720">1280 × 720</option>
+        <option value="1920x1080">1920 × 1080</option>
+      </select>
+    </label>
+    <label>
+      Frame rate
+      <select id="output-fps-select">
+        <option value="15">15 fps</option>
+        <option value="24">24 fps</option>
+        <option value="30">30 fps</option>
+        <option value="60">60 fps</option>
+      </select>
+    </label>
+    <div class="note">Changing these briefly reopens the virtual camera; some apps need the camera re-selected.</div>
   </div>
 
   <script>
@@ -274,8 +1141,8 @@ INDEX_HTML = """<!DOCTYPE html>
       return await res.json();
     }
 
-    async function loadCameras() {
-      const data = await fetchJSON('/api/cameras');
+    async function loadCameras(refresh) {
+      const data = await fetchJSON('/api/cameras' + (refresh ? '?refresh=1&wait=1' : ''));
       const select = document.getElementById('camera-select');
       select.innerHTML = '';
 
@@ -302,6 +1169,32 @@ INDEX_HTML = """<!DOCTYPE html>
       return await fetchJSON('/api/config');
     }
 
+    // Config changes are coalesced and sent as one batched POST at most
+    // every CONFIG_FLUSH_MS, so dragging a slider doesn't fire a request
+    // per input event.
+    const CONFIG_FLUSH_MS = 100;
+    let pendingConfig = {};
+    let flushTimer = null;
+
+    function sendConfig(delta) {
+      Object.assign(pendingConfig, delta);
+      if (flushTimer === null) {
+        flushTimer = setTimeout(flushConfig, CONFIG_FLUSH_MS);
+      }
+    }
+
+    function flushConfig() {
+      flushTimer = null;
+      const batch = pendingConfig;
+      pendingConfig = {};
+      if (Object.keys(batch).length === 0) return;
+      fetchJSON('/api/config', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify(batch)
+      }).catch(console.error);
+    }
+
     function setOrientationButtons(current) {
       document.querySelectorAll('.orientation-buttons button').forEach(btn => {
         if (btn.dataset.orient === current) {
@@ -351,16 +1244,12 @@ INDEX_HTML = """<!DOCTYPE html>
         select.addEventListener('change', () => {
           const val = select.value;
           if (val === '') return;
-          fetchJSON('/api/config', {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ camera_index: Number(val) })
-          }).catch(console.error);
+          sendConfig({ camera_index: Number(val) });
         });
 
         // Refresh button
         document.getElementById('refresh-cams').addEventListener('click', async () => {
-          const cams2 = await loadCameras();
+          const cams2 = await loadCameras(true);
           const cfg2 = await loadConfig();
           const sel = document.getElementById('camera-select');
 
@@ -378,11 +1267,7 @@ INDEX_HTML = """<!DOCTYPE html>
           btn.addEventListener('click', () => {
             const orient = btn.dataset.orient;
             setOrientationButtons(orient);
-            fetchJSON('/api/config', {
-              method: 'POST',
-              headers: { 'Content-Type': 'application/json' },
-              body: JSON.stringify({ orientation: orient })
-            }).catch(console.error);
+            sendConfig({ orientation: orient });
           });
         });
 
@@ -390,45 +1275,128 @@ INDEX_HTML = """<!DOCTYPE html>
         const detSlider = document.getElementById('det-slider');
         const smoothSlider = document.getElementById('smooth-slider');
         const marginSlider = document.getElementById('margin-slider');
+        const detWidthSlider = document.getElementById('detwidth-slider');
 
         const detLabel = document.getElementById('det-label');
         const smoothLabel = document.getElementById('smooth-label');
         const marginLabel = document.getElementById('margin-label');
+        const detWidthLabel = document.getElementById('detwidth-label');
+
+        function detWidthText(v) {
+          return Number(v) === 0 ? 'full' : v + ' px';
+        }
+
+        // Apply a config pushed by the server (ours or another tab's),
+        // leaving alone whatever control the user is currently touching.
+        function applyConfig(c) {
+          const set = (el, value) => {
+            if (document.activeElement !== el) el.value = value;
+          };
+          set(detSlider, c.detection_every_n_frames || 10);
+          set(smoothSlider, c.smoothing_alpha || 0.02);
+          set(marginSlider, c.margin_factor || 2.8);
+          set(detWidthSlider, (c.detection_width !== undefined) ? c.detection_width : 320);
+          if (detectorSelect.options.length > 0) set(detectorSelect, c.detector || 'haar');
+          set(trackerSelect, c.tracker || 'lk');
+          if (c.camera_index !== null && c.camera_index !== undefined &&
+              [...select.options].some(o => o.value === String(c.camera_index))) {
+            set(select, String(c.camera_index));
+          }
+          setOrientationButtons(c.orientation || 'none');
+          if (document.activeElement !== mirrorCheckbox) mirrorCheckbox.checked = !!c.mirror;
+          setOption(outputSizeSelect, `${c.output_width || 640}x${c.output_height || 640}`);
+          setOption(outputFpsSelect, String(c.output_fps || 30));
 
-        detSlider.value = cfg.detection_every_n_frames || 10;
-        smoothSlider.value = cfg.smoothing_alpha || 0.02;
-        marginSlider.value = cfg.margin_factor || 2.8;
+          detLabel.textContent = detSlider.value;
+          smoothLabel.textContent = Number(smoothSlider.value).toFixed(2);
+          marginLabel.textContent = Number(marginSlider.value).toFixed(2);
+          detWidthLabel.textContent = detWidthText(detWidthSlider.value);
+        }
+
+        const detectorSelect = document.getElementById('detector-select');
+        const trackerSelect = document.getElementById('tracker-select');
+        const mirrorCheckbox = document.getElementById('mirror-checkbox');
+        const outputSizeSelect = document.getElementById('output-size-select');
+        const outputFpsSelect = document.getElementById('output-fps-select');
+        // Select `value`, adding it first if it is not one of the presets.
+        function setOption(el, value) {
+          if (document.activeElement === el) return;
+          if (![...el.options].some(o => o.value === value)) {
+            const opt = document.createElement('option');
+            opt.value = opt.textContent = value;
+            el.appendChild(opt);
+          }
+          el.value = value;
+        }
+        applyConfig(cfg);
+
+        mirrorCheckbox.addEventListener('change', () => {
+          sendConfig({ mirror: mirrorCheckbox.checked });
+        });
+
+        outputSizeSelect.addEventListener('change', () => {
+          const [w, h] = outputSizeSelect.value.split('x').map(Number);
+          sendConfig({ output_width: w, output_height: h });
+        });
 
-        detLabel.textContent = detSlider.value;
-        smoothLabel.textContent = Number(smoothSlider.value).toFixed(2);
-        marginLabel.textContent = Number(marginSlider.value).toFixed(2);
+        outputFpsSelect.addEventListener('change', () => {
+          sendConfig({ output_fps: Number(outputFpsSelect.value) });
+        });
 
         detSlider.addEventListener('input', () => {
           detLabel.textContent = detSlider.value;
-          fetchJSON('/api/config', {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ detection_every_n_frames: Number(detSlider.value) })
-          }).catch(console.error);
+          sendConfig({ detection_every_n_frames: Number(detSlider.value) });
         });
 
         smoothSlider.addEventListener('input', () => {
           smoothLabel.textContent = Number(smoothSlider.value).toFixed(2);
-          fetchJSON('/api/config', {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ smoothing_alpha: Number(smoothSlider.value) })
-          }).catch(console.error);
+          sendConfig({ smoothing_alpha: Number(smoothSlider.value) });
         });
 
         marginSlider.addEventListener('input', () => {
           marginLabel.textContent = Number(marginSlider.value).toFixed(2);
-          fetchJSON('/api/config', {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ margin_factor: Number(marginSlider.value) })
-          }).catch(console.error);
+          sendConfig({ margin_factor: Number(marginSlider.value) });
+        });
+
+        const detectors = await fetchJSON('/api/detectors');
+        Object.keys(detectors).forEach(name => {
+          const opt = document.createElement('option');
+          opt.value = name;
+          opt.textContent = name + (detectors[name].available ? '' : ' (model missing)');
+          opt.disabled = !detectors[name].available;
+          detectorSelect.appendChild(opt);
+        });
+        detectorSelect.value = cfg.detector || 'haar';
+        detectorSelect.addEventListener('change', () => {
+          sendConfig({ detector: detectorSelect.value });
+        });
+
+        trackerSelect.addEventListener('change', () => {
+          sendConfig({ tracker: trackerSelect.value });
+        });
+
+        detWidthSlider.addEventListener('input', () => {
+          detWidthLabel.textContent = detWidthText(detWidthSlider.value);
+          sendConfig({ detection_width: Number(detWidthSlider.value) });
+        });
+
+        // One persistent server-sent event stream keeps every open tab in
+        // sync (config pushes) and shows live pipeline state (metrics).
+        const status = document.getElementById('status');
+        const events = new EventSource('/api/events');
+        events.addEventListener('config', e => applyConfig(JSON.parse(e.data)));
+        events.addEventListener('cameras', async () => {
+          await loadCameras();
+          applyConfig(await loadConfig());
+        });
+        events.addEventListener('metrics', e => {
+          const m = JSON.parse(e.data);
+          status.textContent = 'Live · frames sent: ' + (m.frames_sent || 0) +
+            ' · dropped: ' + (m.capture_dropped || 0) +
+            ' · reused: ' + (m.capture_reused || 0) +
+            ' · frame age p95: ' + (m.frame_age_p95_ms || 0) + ' ms';
         });
+        events.onerror = () => { status.textContent = 'Disconnected, retrying...'; };
       } catch (err) {
         console.error('initUI failed:', err);
       }
@@ -447,34 +1415,114 @@ def index():
 
 @app.route("/api/cameras")
 def api_cameras():
+    """Cached camera list. ?refresh=1 forces a re-probe; add &wait=1 to wait for it."""
     log.debug("HTTP GET /api/cameras")
-    cams = list_cameras()
+    if request.args.get("refresh"):
+        camera_registry.refresh(
+            wait=bool(request.args.get("wait")), timeout=CAMERA_PROBE_WAIT, force=True
+        )
+    cams = camera_registry.cameras(wait_first=CAMERA_PROBE_WAIT)
     cfg = get_config()
     current_idx = cfg.get("camera_index")
     return jsonify({
         "cameras": [
             {
                 "index": i,
-                "label": f"Camera {i}" + (" (current)" if i == current_idx else "")
+                "label": (camera_name(i) or f"Camera {i}")
+                + (f" [{i}]" if camera_name(i) else "")
+                + (" (current)" if i == current_idx else "")
             }
             for i in cams
-        ]
+        ],
+        "probe": camera_registry.status(),
     })
 
-@app.route("/api/config", methods=["GET", "POST"])
-def api_config():
-    if request.method == "GET":
-        log.debug("HTTP GET /api/config")
-        return jsonify(get_config())
-    log.debug("HTTP POST /api/config")
-    data = request.get_json(force=True, silent=True) or {}
-    log.debug("Config POST payload: %s", data)
+@app.route("/api/detectors")
+def api_detectors():
+    log.debug("HTTP GET /api/detectors")
+    overrides = get_config().get("detector_params") or {}
+    result = {}
+    for name, cls in DETECTOR_CLASSES.items():
+        params = dict(cls.DEFAULT_PARAMS, **overrides.get(name, {}))
+        result[name] = {
+            "params": params,
+            "available": Path(params["model_path"]).is_file(),
+        }
+    return jsonify(result)
 
-    changes = {}
+@app.route("/api/events")
+def api_events():
+    """Server-sent event stream: "config" on every change, "metrics" every second."""
+    log.debug("HTTP GET /api/events")
+    sub = config_events.subscribe()
+
+    def stream():
+        try:
+            yield format_sse("config", get_config_snapshot().json_bytes)
+            next_metrics = 0.0
+            while True:
+                now = time.monotonic()
+                if now >= next_metrics:
+                    yield format_sse("metrics", json.dumps(get_metrics()))
+                    next_metrics = now + EVENT_METRICS_INTERVAL
+                for event, data in sub.take(max(0.0, next_metrics - now)).items():
+                    yield format_sse(event, data)
+        finally:
+            config_events.unsubscribe(sub)
+
+    return Response(
+        stream(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.route("/api/metrics")
+def api_metrics():
+    return jsonify(get_metrics())
+
+@app.route("/api/capture")
+def api_capture():
+    """Negotiated capture mode of the open camera plus the per-device cache."""
+    log.debug("HTTP GET /api/capture")
+    m = get_metrics()
+    cfg = get_config_snapshot()
+    out_w, out_h = cfg.output_size
+    return jsonify({
+        "device": m.get("capture_device"),
+        "mode": m.get("capture_mode"),
+        "output": output_target(cfg.output_size, cfg.output_fps),
+        "cached": cfg.get("capture_modes") or {},
+        "candidates": [
+            format_capture_mode(c) for c in capture_mode_candidates(out_w, out_h, cfg.output_fps)
+        ],
+    })
+
+@app.route("/api/config", methods=["GET", "POST"])
+def api_config():
+    if request.method == "GET":
+        log.debug("HTTP GET /api/config")
+        return Response(get_config_snapshot().json_bytes, mimetype="application/json")
+    log.debug("HTTP POST /api/config")
+    data = request.get_json(force=True, silent=True) or {}
+    log.debug("Config POST payload: %s", data)
+
+    changes = {}
     if "camera_index" in data:
         val = data["camera_index"]
         if isinstance(val, int):
             changes["camera_index"] = val
+    if "camera_max_index" in data:
+        try:
+            changes["camera_max_index"] = min(64, max(1, int(data["camera_max_index"])))
+        except (TypeError, ValueError):
+            log.warning("Invalid camera_max_index: %s", data["camera_max_index"])
+    if "source" in data:
+        if data["source"] in FRAME_SOURCES:
+            changes["source"] = data["source"]
+    if "source_path" in data:
+        val = data["source_path"]
+        if val is None or isinstance(val, str):
+            changes["source_path"] = val
     if "orientation" in data:
         if data["orientation"] in ("none", "cw", "ccw"):
             changes["orientation"] = data["orientation"]
@@ -502,201 +1550,2803 @@ def api_config():
             changes["margin_factor"] = m
         except (TypeError, ValueError):
             log.warning("Invalid margin_factor: %s", data["margin_factor"])
+    if "async_detection" in data:
+        if isinstance(data["async_detection"], bool):
+            changes["async_detection"] = data["async_detection"]
+    if "detector" in data:
+        if data["detector"] in DETECTORS:
+            changes["detector"] = data["detector"]
+    if "detector_params" in data:
+        changes["detector_params"] = coerce_detector_params(
+            data["detector_params"], get_config().get("detector_params")
+        )
+    if "tracker" in data:
+        if data["tracker"] in TRACKERS:
+            changes["tracker"] = data["tracker"]
+    if "roi_detection" in data:
+        if isinstance(data["roi_detection"], bool):
+            changes["roi_detection"] = data["roi_detection"]
+    for key in ("roi_max_misses", "roi_full_scan_every"):
+        if key in data:
+            try:
+                changes[key] = max(1, int(data[key]))
+            except (TypeError, ValueError):
+                log.warning("Invalid %s: %s", key, data[key])
+    if "capture_modes" in data:
+        # Entries come from negotiation, so only clearing is supported: {}
+        # drops the whole cache, {"<device key>": null} drops one device.
+        val = data["capture_modes"]
+        if isinstance(val, dict):
+            current = get_config().get("capture_modes") or {}
+            changes["capture_modes"] = {
+                k: v for k, v in current.items() if val and val.get(k, v) is not None
+            }
+    if "output_format" in data:
+        if data["output_format"] == "auto" or data["output_format"] in OUTPUT_FORMATS:
+            changes["output_format"] = data["output_format"]
+    for key in ("low_latency", "mirror"):
+        if key in data and isinstance(data[key], bool):
+            changes[key] = data[key]
+    for key in ("output_width", "output_height"):
+        if key in data:
+            try:
+                lo, hi = OUTPUT_SIZE_RANGE
+                changes[key] = min(max(int(data[key]), lo), hi) // 2 * 2
+            except (TypeError, ValueError):
+                log.warning("Invalid %s: %s", key, data[key])
+    if "output_fps" in data:
+        try:
+            lo, hi = OUTPUT_FPS_RANGE
+            changes["output_fps"] = min(max(int(data["output_fps"]), lo), hi)
+        except (TypeError, ValueError):
+            log.warning("Invalid output_fps: %s", data["output_fps"])
+    if "detection_width" in data:
+        try:
+            dw = int(data["detection_width"])
+            if dw < 0:
+                dw = 0
+            elif 0 < dw < MIN_DETECTION_WIDTH:
+                dw = MIN_DETECTION_WIDTH
+            changes["detection_width"] = dw
+        except (TypeError, ValueError):
+            log.warning("Invalid detection_width: %s", data["detection_width"])
 
     if changes:
         update_config(changes)
 
-    return jsonify(get_config())
+    return Response(get_config_snapshot().json_bytes, mimetype="application/json")
+
+# ==========================
+# Frame buffers
+# ==========================
+BUFFER_POOL_MAX = 16        # buffers kept per (shape, dtype)
+BUFFER_POOL_MAX_KEYS = 32   # shapes kept; detection ROIs come in many sizes
+
+
+class BufferPool:
+    """Reusable numpy arrays keyed by shape and dtype, with explicit ownership.
+
+    acquire() hands out a free pooled array, or allocates one, holding one
+    reference for the caller. Handing a buffer on to another holder (the
+    frame mailbox, the detection worker, the tracker, the frame held for
+    output) retain()s it for that holder, and every holder release()s its
+    reference when done with it; a buffer is only reused once all of them
+    have. retain() and release() ignore arrays the pool does not track
+    (views, arrays OpenCV allocated, buffers of an evicted shape), so callers
+    need not know where an array came from. Callers pass the buffers as
+    `dst=` / `image=` to OpenCV, so in steady state no frame-sized memory is
+    allocated. A buffer that is never released just stops being reused,
+    which shows up in the allocation count rather than as a corrupt frame.
+    """
+
+    def __init__(self, max_per_key=BUFFER_POOL_MAX, max_keys=BUFFER_POOL_MAX_KEYS):
+        self.max_per_key = max_per_key
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._buffers = OrderedDict()  # least recently used shape first; [array, refs] entries
+        self._entries = {}             # id(array) -> its entry
+        self.allocations = 0
+        self.reused = 0
+
+    @staticmethod
+    def _key(shape, dtype):
+        return tuple(shape), np.dtype(dtype).str
+
+    def _buffers_for(self, key):
+        # Caller holds self._lock.
+        buffers = self._buffers.get(key)
+        if buffers is None:
+            buffers = self._buffers[key] = []
+            while len(self._buffers) > self.max_keys:
+                # Buffers still in use just stop being pooled.
+                _, evicted = self._buffers.popitem(last=False)
+                for entry in evicted:
+                    del self._entries[id(entry[0])]
+        else:
+            self._buffers.move_to_end(key)
+        return buffers
+
+    def _track(self, buffers, array):
+        # Caller holds self._lock.
+        if len(buffers) < self.max_per_key:
+            entry = [array, 1]
+            buffers.append(entry)
+            self._entries[id(array)] = entry
+
+    def _entry(self, array):
+        # Caller holds self._lock.
+        entry = self._entries.get(id(array))
+        return entry if entry is not None and entry[0] is array else None
+
+    def acquire(self, shape, dtype=np.uint8):
+        with self._lock:
+            buffers = self._buffers_for(self._key(shape, dtype))
+            for entry in buffers:
+                if entry[1] == 0:
+                    entry[1] = 1
+                    self.reused += 1
+                    return entry[0]
+            self.allocations += 1
+            buf = np.empty(shape, dtype)
+            self._track(buffers, buf)
+            return buf
+
+    def adopt(self, array):
+        """Track an array allocated elsewhere (e.g. by OpenCV) for reuse; the
+        caller holds its one reference."""
+        with self._lock:
+            self.allocations += 1
+            if array.base is None and self._entry(array) is None:
+                self._track(self._buffers_for(self._key(array.shape, array.dtype)), array)
+        return array
+
+    def retain(self, array):
+        """Take another reference to `array` for a new holder; returns it."""
+        with self._lock:
+            entry = self._entry(array)
+            if entry is not None:
+                entry[1] += 1
+        return array
+
+    def release(self, array):
+        """Drop one reference to `array` (None is ignored)."""
+        if array is None:
+            return
+        with self._lock:
+            entry = self._entry(array)
+            if entry is not None and entry[1] > 0:
+                entry[1] -= 1
+
+    def like(self, array):
+        return self.acquire(array.shape, array.dtype)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "allocations": self.allocations,
+                "reused": self.reused,
+                "buffers": len(self._entries),
+                "in_use": sum(1 for entry in self._entries.values() if entry[1] > 0),
+            }
+
+
+frame_pool = BufferPool()
+
+
+# The pooled_* helpers return a buffer the caller owns and must release.
+def pooled_resize(image, size, interpolation=cv2.INTER_AREA):
+    """cv2.resize into a pooled buffer; `size` is (width, height)."""
+    w, h = size
+    dst = frame_pool.acquire((h, w) + image.shape[2:], image.dtype)
+    return cv2.resize(image, size, dst=dst, interpolation=interpolation)
+
+
+def pooled_gray(image):
+    dst = frame_pool.acquire(image.shape[:2], image.dtype)
+    return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY, dst=dst)
+
+# ==========================
+# Frame pacing
+# ==========================
+class FramePacer:
+    """Sleep until the next frame deadline at a fixed rate.
+
+    Deadlines are absolute (monotonic clock), so time spent producing a frame
+    is absorbed instead of added to the period. When a deadline is missed the
+    schedule restarts from now rather than bursting to catch up. A pacer with
+    fps=None never sleeps.
+    """
+
+    def __init__(self, fps):
+        self.fps = fps
+        self._next_deadline = None
+        self.overruns = 0
+
+    def reset(self):
+        self._next_deadline = None
+
+    def wait(self):
+        if not self.fps:
+            return
+        now = time.monotonic()
+        if self._next_deadline is None:
+            self._next_deadline = now
+        delay = self._next_deadline - now
+        if delay > 0:
+            time.sleep(delay)
+        elif self._next_deadline < now - 1.0 / self.fps:
+            # More than a full frame late: don't try to catch up with a burst.
+            self.overruns += 1
+            self._next_deadline = now
+        self._next_deadline += 1.0 / self.fps
+
+
+# ==========================
+# Frame sources
+# ==========================
+FRAME_SOURCES = ("camera", "file", "images", "synthetic")
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff", ".webp")
+
+
+class FrameSource:
+    """Base class for anything that produces BGR frames.
+
+    Sources follow the small subset of the cv2.VideoCapture API that the rest
+    of the pipeline uses: read() -> (ret, frame), isOpened() and release().
+    read(image=buf) decodes into `buf` when the source can and the shape
+    matches; callers must use the returned frame, which may be a new array.
+    File-backed and synthetic sources pace themselves to `fps` when `realtime`
+    is set, and return frames as fast as possible otherwise.
+    """
+
+    # Monotonic time the last frame was captured, when the source knows it
+    # better than "when read() returned" (see CameraSource).
+    capture_timestamp = None
+
+    def __init__(self, fps=None, realtime=True):
+        self.fps = fps or FPS
+        self.realtime = realtime
+        self._pacer = FramePacer(self.fps if realtime else None)
+
+    def _pace(self):
+        self._pacer.wait()
+
+    def read(self, image=None):
+        raise NotImplementedError
+
+    def isOpened(self):
+        return True
+
+    def release(self):
+        pass
+
+
+CaptureMode = namedtuple("CaptureMode", "fourcc width height fps")
+
+CAPTURE_SIZES = ((640, 480), (1280, 720), (1920, 1080))
+# Cheapest to consume first: YUYV needs no decode, MJPEG needs a JPEG decode
+# per frame but is what most USB 2 cameras use above 640x480 at full rate.
+CAPTURE_FOURCCS = ("YUYV", "MJPG")
+CAPTURE_FPS_TOLERANCE = 0.9  # accept a delivered rate this close to the request
+CAPTURE_DRAIN_MAX = 4        # most queued frames a low-latency read skips
+CAPTURE_CLOCK_SKEW = 2.0     # seconds; driver timestamps further off are ignored
+CAPTURE_QUEUED_GRAB = 0.1    # of a frame interval; a quicker grab() did not wait for the sensor
+CAPTURE_LATENCY_DRIFT = 0.001  # seconds per grab the latency floor may rise by
+
+
+def fourcc_to_str(value):
+    value = int(value)
+    return "".join(chr((value >> (8 * i)) & 0xFF) for i in range(4)).strip("\x00 ")
+
+
+def format_capture_mode(mode):
+    if mode is None:
+        return None
+    return f"{mode.fourcc} {mode.width}x{mode.height}@{mode.fps:g}"
+
+
+def capture_mode_candidates(out_w=OUT_W, out_h=OUT_H, fps=FPS):
+    """Capture modes to try, cheapest first.
+
+    Sizes whose short side covers the output's short side come first, smallest
+    first; smaller sizes follow, largest first, as fallbacks. At each size
+    YUYV is tried before MJPEG.
+    """
+    need = min(out_w, out_h)
+    large = sorted((s for s in CAPTURE_SIZES if s[1] >= need), key=lambda s: s[0] * s[1])
+    small = sorted((s for s in CAPTURE_SIZES if s[1] < need), key=lambda s: -s[0] * s[1])
+    return [
+        CaptureMode(fourcc, w, h, fps)
+        for w, h in large + small
+        for fourcc in CAPTURE_FOURCCS
+    ]
+
+
+def coerce_capture_mode(value):
+    """CaptureMode from its persisted dict form, or None if malformed."""
+    try:
+        return CaptureMode(
+            str(value["fourcc"]), int(value["width"]), int(value["height"]), float(value["fps"])
+        )
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def apply_capture_mode(cap, mode):
+    """Request `mode` from `cap` and return the CaptureMode actually delivered.
+
+    The size is taken from a real frame rather than trusted from cap.get(),
+    since some drivers report the requested size while streaming another.
+    Returns None if no frame arrives.
+    """
+    cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*mode.fourcc))
+    cap.set(cv2.CAP_PROP_FRAME_WIDTH, mode.width)
+    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, mode.height)
+    cap.set(cv2.CAP_PROP_FPS, mode.fps)
+    ok, frame = cap.read()
+    if not ok or frame is None:
+        return None
+    height, width = frame.shape[:2]
+    return CaptureMode(
+        fourcc_to_str(cap.get(cv2.CAP_PROP_FOURCC)) or mode.fourcc,
+        width,
+        height,
+        float(cap.get(cv2.CAP_PROP_FPS) or mode.fps),
+    )
+
+
+def capture_mode_satisfies(actual, wanted):
+    return (
+        actual is not None
+        and actual.fourcc == wanted.fourcc
+        and (actual.width, actual.height) == (wanted.width, wanted.height)
+        and actual.fps >= wanted.fps * CAPTURE_FPS_TOLERANCE
+    )
+
+
+def negotiate_capture_mode(cap, cached=None, out_w=OUT_W, out_h=OUT_H, fps=FPS):
+    """Settle `cap` on the cheapest mode it really delivers.
+
+    A `cached` mode from an earlier negotiation is tried first and kept if the
+    device still delivers it. Otherwise candidates are tried in order; if none
+    is delivered as requested, the first one that produced frames at all is
+    used. Returns (mode, negotiated): the delivered CaptureMode (None if the
+    device gave no frames) and whether a full negotiation ran.
+    """
+    if cached is not None:
+        actual = apply_capture_mode(cap, cached)
+        if capture_mode_satisfies(actual, cached):
+            return actual, False
+        log.info(
+            "Cached capture mode %s not delivered (got %s), renegotiating",
+            format_capture_mode(cached), format_capture_mode(actual),
+        )
+
+    fallback = None
+    for wanted in capture_mode_candidates(out_w, out_h, fps):
+        actual = apply_capture_mode(cap, wanted)
+        log.debug("Capture mode %s -> %s", format_capture_mode(wanted), format_capture_mode(actual))
+        if capture_mode_satisfies(actual, wanted):
+            return actual, True
+        if actual is not None and fallback is None:
+            fallback = wanted
+    if fallback is None:
+        return None, True
+    return apply_capture_mode(cap, fallback), True
+
+
+class CameraSource(FrameSource):
+    """Live capture device opened through cv2.VideoCapture.
+
+    The capture mode is negotiated on open (see negotiate_capture_mode) for
+    an `output_size` output at `fps`; `capture_mode` is a previously
+    negotiated mode to try first.
+
+    In `low_latency` mode the driver queue is shrunk to one buffer where the
+    backend supports it, and read() grab()s past a frame only when a newer
+    one must already be queued behind it, retrieve()ing (decoding) only the
+    newest. `capture_timestamp` is the driver's buffer timestamp when it is on
+    the monotonic clock (V4L2), else the time grab() returned.
+    """
+
+    def __init__(self, index, capture_mode=None, fps=None, low_latency=False, output_size=None):
+        super().__init__(fps=fps, realtime=False)  # the device paces itself
+        self.index = index
+        self.cap = cv2.VideoCapture(index)
+        self.mode = None
+        self.negotiated = False
+        self.low_latency = low_latency
+        self.buffer_size_set = False
+        self.drained = 0
+        self._interval = 1.0 / self.fps
+        self._latency_floor = float("inf")  # lowest driver timestamp -> dequeue delay seen
+        self._last_grab = None
+        if self.cap.isOpened() and low_latency:
+            # Applied before negotiation, which restarts the stream anyway.
+            self.buffer_size_set = bool(self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1))
+        if self.cap.isOpened():
+            started = time.monotonic()
+            out_w, out_h = output_size or (OUT_W, OUT_H)
+            self.mode, self.negotiated = negotiate_capture_mode(
+                self.cap, capture_mode, out_w, out_h, self.fps
+            )
+            log.info(
+                "Camera %s capture mode %s (%s in %.2fs)",
+                index, format_capture_mode(self.mode),
+                "negotiated" if self.negotiated else "cached", time.monotonic() - started,
+            )
+            if self.mode is not None and self.mode.fps > 0:
+                self._interval = 1.0 / self.mode.fps
+
+    def _driver_timestamp(self, now):
+        """Buffer timestamp as time.monotonic(), or None if unusable."""
+        msec = self.cap.get(cv2.CAP_PROP_POS_MSEC)
+        if not msec or msec <= 0:
+            return None
+        ts = msec / 1000.0
+        if not 0.0 <= now - ts < CAPTURE_CLOCK_SKEW:
+            return None  # not on the monotonic clock (or a file position)
+        return ts
+
+    def _grab(self):
+        """grab() one frame; returns (ok, newer_queued).
+
+        `newer_queued` says a newer frame is already waiting in the driver
+        queue, so grabbing again would not block. Buffer timestamps trail the
+        dequeue by the device's own latency (UVC stamps the start of
+        exposure), so a frame's age is measured against the lowest delay seen
+        rather than against zero: a newer frame is queued once a whole frame
+        interval has passed on top of that. Without timestamps, a grab that
+        did not wait for the sensor, after a gap of two or more intervals
+        since the previous one, means frames piled up in the meantime.
+        """
+        started = time.monotonic()
+        previous, self._last_grab = self._last_grab, None
+        if not self.cap.grab():
+            return False, False
+        now = self._last_grab = time.monotonic()
+        captured = self._driver_timestamp(now)
+        if captured is not None:
+            self.capture_timestamp = captured
+            delay = now - captured
+            self._latency_floor = min(delay, self._latency_floor + CAPTURE_LATENCY_DRIFT)
+            return True, delay - self._latency_floor > self._interval
+        self.capture_timestamp = now
+        if previous is None or now - started > CAPTURE_QUEUED_GRAB * self._interval:
+            return True, False
+        return True, started - previous > 2 * self._interval
+
+    def read(self, image=None):
+        ok, newer_queued = self._grab()
+        drained = 0
+        while ok and newer_queued and self.low_latency and drained < CAPTURE_DRAIN_MAX:
+            ok, newer_queued = self._grab()
+            drained += 1
+        self.drained += drained
+        if not ok:
+            return False, None
+        return self.cap.retrieve(image)
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def release(self):
+        self.cap.release()
+
+
+class VideoFileSource(FrameSource):
+    """Recorded video file, looped at end of stream."""
+
+    def __init__(self, path, realtime=True, loop=True):
+        self.path = str(path)
+        self.cap = cv2.VideoCapture(self.path)
+        file_fps = self.cap.get(cv2.CAP_PROP_FPS) if self.cap.isOpened() else 0
+        super().__init__(fps=file_fps if file_fps and file_fps > 0 else None, realtime=realtime)
+        self.loop = loop
+
+    def read(self, image=None):
+        self._pace()
+        ret, frame = self.cap.read(image)
+        if not ret and self.loop:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, frame = self.cap.read(image)
+        return ret, frame
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def release(self):
+        self.cap.release()
+
+
+class ImageSequenceSource(FrameSource):
+    """Directory of still images, played back in name order and looped."""
+
+    def __init__(self, directory, fps=None, realtime=True, loop=True):
+        super().__init__(fps=fps, realtime=realtime)
+        self.directory = Path(directory)
+        self.loop = loop
+        if self.directory.is_dir():
+            self.paths = sorted(
+                p for p in self.directory.iterdir() if p.suffix.lower() in IMAGE_EXTENSIONS
+            )
+        else:
+            self.paths = []
+        self._pos = 0
+
+    def read(self, image=None):
+        self._pace()
+        if self._pos >= len(self.paths):
+            if not self.loop or not self.paths:
+                return False, None
+            self._pos = 0
+        path = self.paths[self._pos]
+        self._pos += 1
+        frame = cv2.imread(str(path), cv2.IMREAD_COLOR)
+        if frame is None:
+            log.warning("Failed to decode image %s", path)
+            return False, None
+        return True, frame
+
+    def isOpened(self):
+        return bool(self.paths)
+
+
+class SyntheticSource(FrameSource):
+    """Deterministic generator of moving face-like sprites.
+
+    Frame N is always identical for a given (width, height, faces, seed), so
+    runs are reproducible across machines and versions.
+    """
+
+    def __init__(self, width=640, height=480, fps=None, realtime=True, faces=1, seed=0):
+        super().__init__(fps=fps, realtime=realtime)
+        self.width = width
+        self.height = height
+        self.faces = max(1, faces)
+        self.seed = seed
+        rng = np.random.default_rng(seed)
+        # Static textured background so detection has something to reject.
+        gradient = np.linspace(40, 110, width, dtype=np.float32)
+        background = np.tile(gradient, (height, 1))
+        background += rng.normal(0, 6, (height, width)).astype(np.float32)
+        background = np.clip(background, 0, 255).astype(np.uint8)
+        self.background = cv2.merge([background, background, (background * 0.9).astype(np.uint8)])
+        self.phases = rng.uniform(0, 2 * np.pi, (self.faces, 2))
+        self.speeds = rng.uniform(0.6, 1.4, (self.faces, 2))
+        self._frame_no = 0
+
+    def _draw_face(self, frame, cx, cy, size):
+        axes = (int(size * 0.4), int(size * 0.5))
+        cv2.ellipse(frame, (cx, cy), axes, 0, 0, 360, (150, 180, 225), -1, cv2.LINE_AA)
+        eye_dx, eye_dy = int(size * 0.17), int(size * 0.12)
+        eye_r = max(2, int(size * 0.06))
+        for sign in (-1, 1):
+            ex = cx + sign * eye_dx
+            cv2.circle(frame, (ex, cy - eye_dy), eye_r, (40, 40, 40), -1, cv2.LINE_AA)
+            cv2.line(
+                frame,
+                (ex - eye_r * 2, cy - eye_dy - eye_r * 2),
+                (ex + eye_r * 2, cy - eye_dy - eye_r * 2),
+                (50, 60, 80),
+                max(1, eye_r // 2),
+                cv2.LINE_AA,
+            )
+        cv2.ellipse(
+            frame,
+            (cx, cy + int(size * 0.22)),
+            (int(size * 0.15), int(size * 0.05)),
+            0, 0, 180, (60, 60, 150), max(1, eye_r // 2), cv2.LINE_AA,
+        )
+
+    def read(self, image=None):
+        self._pace()
+        t = self._frame_no / self.fps
+        self._frame_no += 1
+        if image is not None and image.shape == self.background.shape:
+            np.copyto(image, self.background)
+            frame = image
+        else:
+            frame = self.background.copy()
+        size = min(self.width, self.height) // (2 + self.faces)
+        for i in range(self.faces):
+            px, py = self.phases[i]
+            sx, sy = self.speeds[i]
+            span_x = (self.width - size) / 2
+            span_y = (self.height - size) / 2
+            cx = int(self.width / 2 + 0.8 * span_x * np.sin(sx * t * 0.5 + px))
+            cy = int(self.height / 2 + 0.6 * span_y * np.sin(sy * t * 0.7 + py))
+            self._draw_face(frame, cx, cy, size)
+        return True, frame
+
+
+def open_frame_source(kind, camera_index=None, path=None, realtime=True, capture_mode=None,
+                      low_latency=False, output_size=None, fps=None):
+    """Create the frame source described by `kind` (one of FRAME_SOURCES).
+
+    Returns None when there is nothing to open yet (no camera selected, or no
+    path for a file-backed source).
+    """
+    if kind == "camera":
+        if camera_index is None:
+            return None
+        return CameraSource(
+            camera_index, capture_mode=capture_mode, fps=fps, low_latency=low_latency,
+            output_size=output_size,
+        )
+    if kind == "synthetic":
+        return SyntheticSource(realtime=realtime)
+    if not path:
+        return None
+    if kind == "file":
+        return VideoFileSource(path, realtime=realtime)
+    if kind == "images":
+        return ImageSequenceSource(path, realtime=realtime)
+    raise ValueError(f"Unknown frame source: {kind!r}")
+
+
+# ==========================
+# Output sinks
+# ==========================
+OUTPUT_SINKS = ("vcam", "null", "file", "shm")
+OUTPUT_FORMATS = ("bgr", "rgb", "i420", "nv12", "yuyv")
+VCAM_PIXEL_FORMATS = {
+    "bgr": pyvirtualcam.PixelFormat.BGR,
+    "rgb": pyvirtualcam.PixelFormat.RGB,
+    "i420": pyvirtualcam.PixelFormat.I420,
+    "nv12": pyvirtualcam.PixelFormat.NV12,
+    "yuyv": pyvirtualcam.PixelFormat.YUYV,
+}
+# First guess at the virtual camera backend's native format, per platform;
+# checked against the backend's native_fmt once it is open.
+VCAM_DEFAULT_FORMATS = {"Linux": "i420", "Windows": "nv12"}
+BGR2YUV_YUYV = getattr(cv2, "COLOR_BGR2YUV_YUYV", None)  # not in every OpenCV build
+RAW_EXTENSIONS = (".raw", ".rgb")
+VIDEO_FOURCCS = {".mp4": "mp4v", ".avi": "MJPG", ".mkv": "MJPG"}
+SHM_MAGIC = b"FCAM"
+# magic, width, height, channels, slots, latest seq (slot = (seq - 1) % slots)
+SHM_HEADER = struct.Struct("<4sIIIIQ")
+SHM_HEADER_SIZE = 64
+
+
+def convert_output(bgr, pixel_format):
+    """Convert a composed BGR frame to `pixel_format` (one of OUTPUT_FORMATS).
+
+    Returns (frame, conversions), `conversions` naming the passes that ran,
+    e.g. ("BGR>I420",); BGR output passes `bgr` itself through untouched,
+    anything else is a new frame_pool buffer the caller releases.
+    Planar formats come out as (height * 3 / 2, width) arrays and YUYV as
+    (height, width, 2), the layouts pyvirtualcam expects.
+    """
+    if pixel_format == "bgr":
+        return bgr, ()
+    h, w = bgr.shape[:2]
+    if pixel_format == "rgb":
+        out = frame_pool.acquire((h, w, 3))
+        return cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB, dst=out), ("BGR>RGB",)
+    if pixel_format == "yuyv" and BGR2YUV_YUYV is not None:
+        out = frame_pool.acquire((h, w, 2))
+        return cv2.cvtColor(bgr, BGR2YUV_YUYV, dst=out), ("BGR>YUYV",)
+
+    i420 = cv2.cvtColor(bgr, cv2.COLOR_BGR2YUV_I420, dst=frame_pool.acquire((h * 3 // 2, w)))
+    if pixel_format == "i420":
+        return i420, ("BGR>I420",)
+    flat = i420.reshape(-1)
+    u = flat[h * w:h * w * 5 // 4]
+    v = flat[h * w * 5 // 4:]
+    try:
+        if pixel_format == "nv12":
+            out = frame_pool.acquire((h * 3 // 2, w))
+            out[:h] = i420[:h]
+            uv = out.reshape(-1)[h * w:].reshape(-1, 2)
+            uv[:, 0] = u
+            uv[:, 1] = v
+            return out, ("BGR>I420", "I420>NV12")
+        if pixel_format == "yuyv":
+            # Pixel pairs are Y0 U Y1 V; each chroma row serves two image rows.
+            out = frame_pool.acquire((h, w, 2))
+            pairs = out.reshape(h // 2, 2, w // 2, 4)
+            luma = i420[:h].reshape(h // 2, 2, w // 2, 2)
+            pairs[..., 0] = luma[..., 0]
+            pairs[..., 2] = luma[..., 1]
+            pairs[..., 1] = u.reshape(h // 2, 1, w // 2)
+            pairs[..., 3] = v.reshape(h // 2, 1, w // 2)
+            return out, ("BGR>I420", "I420>YUYV")
+    finally:
+        frame_pool.release(i420)
+    raise ValueError(f"Unknown output pixel format: {pixel_format!r}")
+
+
+class FrameSink:
+    """Base class for outputs of the crop pipeline.
+
+    Sinks receive height x width frames in their `pixel_format` through send().
+    FORMATS lists the pixel formats a sink accepts; "auto" (or one it does not
+    accept) picks NATIVE_FORMAT, the one it can use without converting again.
+    Sinks never sleep: pacing is the job of FramePacer, so a sink can also be
+    driven as fast as the pipeline allows. Sinks are context managers.
+    """
+
+    FORMATS = OUTPUT_FORMATS
+    NATIVE_FORMAT = "bgr"
+
+    def __init__(self, width, height, fps, pixel_format="auto"):
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.frames_sent = 0
+        self.requested_format = pixel_format
+        self.pixel_format = self.choose_format(pixel_format)
+
+    def choose_format(self, requested):
+        if requested in self.FORMATS:
+            return requested
+        if requested not in (None, "auto"):
+            log.warning(
+                "%s does not accept %s frames, using %s",
+                type(self).__name__, requested, self.NATIVE_FORMAT,
+            )
+        return self.NATIVE_FORMAT
+
+    @property
+    def description(self):
+        return type(self).__name__
+
+    def open(self):
+        return self
+
+    def send(self, frame):
+        self.frames_sent += 1
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class NullSink(FrameSink):
+    """Discard every frame; useful to measure raw pipeline throughput."""
+
+    @property
+    def description(self):
+        return "null sink"
+
+
+class VirtualCameraSink(FrameSink):
+    """pyvirtualcam output (v4l2loopback on Linux, OBS etc. elsewhere).
+
+    With "auto", the camera is opened in the platform's usual backend format
+    and reopened in the backend's native format if that turns out to differ,
+    so pyvirtualcam never has to convert the frame a second time.
+    """
+
+    NATIVE_FORMAT = VCAM_DEFAULT_FORMATS.get(platform.system(), "bgr")
+
+    def __init__(self, width, height, fps, device=None, pixel_format="auto"):
+        super().__init__(width, height, fps, pixel_format)
+        self.device = device
+        self.vcam = None
+
+    @property
+    def description(self):
+        device = self.vcam.device if self.vcam else self.device
+        return f"virtual camera {device} ({self.pixel_format})"
+
+    def _open(self, pixel_format):
+        return pyvirtualcam.Camera(
+            width=self.width,
+            height=self.height,
+            fps=self.fps,
+            fmt=VCAM_PIXEL_FORMATS[pixel_format],
+            device=self.device,
+            print_fps=True,
+        )
+
+    def open(self):
+        self.vcam = self._open(self.pixel_format)
+        native = {v: k for k, v in VCAM_PIXEL_FORMATS.items()}.get(self.vcam.native_fmt)
+        if self.requested_format in (None, "auto") and native and native != self.pixel_format:
+            log.info("Virtual camera backend is native %s, reopening in that format", native)
+            self.vcam.close()
+            self.vcam = self._open(native)
+            self.pixel_format = native
+        return self
+
+    def send(self, frame):
+        self.vcam.send(frame)
+        super().send(frame)
+
+    def close(self):
+        if self.vcam is not None:
+            self.vcam.close()
+            self.vcam = None
+
+
+class FileSink(FrameSink):
+    """Write frames to a file.
+
+    `.raw`/`.rgb` paths receive the bare frame bytes back to back (RGB unless
+    another pixel format is asked for); anything else is encoded with
+    cv2.VideoWriter (codec picked from the extension), which takes BGR.
+    """
+
+    def __init__(self, width, height, fps, path, pixel_format="auto"):
+        self.path = Path(path)
+        if self.path.suffix.lower() in RAW_EXTENSIONS:
+            self.NATIVE_FORMAT = "rgb"
+        else:
+            self.FORMATS = ("bgr",)
+        super().__init__(width, height, fps, pixel_format)
+        self._fh = None
+        self._writer = None
+
+    @property
+    def description(self):
+        return f"file sink {self.path}"
+
+    def open(self):
+        suffix = self.path.suffix.lower()
+        if suffix in RAW_EXTENSIONS:
+            self._fh = open(self.path, "wb")
+        else:
+            fourcc = cv2.VideoWriter_fourcc(*VIDEO_FOURCCS.get(suffix, "MJPG"))
+            self._writer = cv2.VideoWriter(
+                str(self.path), fourcc, self.fps, (self.width, self.height)
+            )
+            if not self._writer.isOpened():
+                raise RuntimeError(f"Failed to open video writer for {self.path}")
+        return self
+
+    def send(self, frame):
+        if self._fh is not None:
+            self._fh.write(frame.tobytes())
+        else:
+            self._writer.write(frame)
+        super().send(frame)
+
+    def close(self):
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+        if self._writer is not None:
+            self._writer.release()
+            self._writer = None
+
+
+class SharedMemorySink(FrameSink):
+    """Publish frames into a multiprocessing.shared_memory ring buffer.
+
+    Layout: a SHM_HEADER_SIZE-byte header (SHM_HEADER) followed by `slots`
+    frames of height*width*3 bytes, RGB unless BGR is asked for. The frame is
+    written into its slot before the header's sequence number is bumped, so
+    readers poll the sequence and copy slot (seq - 1) % slots.
+    """
+
+    FORMATS = ("rgb", "bgr")
+    NATIVE_FORMAT = "rgb"
+
+    def __init__(self, width, height, fps, name="facecam", slots=4, pixel_format="auto"):
+        super().__init__(width, height, fps, pixel_format)
+        self.name = name
+        self.slots = slots
+        self.frame_bytes = width * height * 3
+        self.shm = None
+        self._ring = None
+
+    @property
+    def description(self):
+        return f"shared memory ring {self.name} ({self.slots} slots)"
+
+    def open(self):
+        size = SHM_HEADER_SIZE + self.slots * self.frame_bytes
+        try:
+            self.shm = shared_memory.SharedMemory(name=self.name, create=True, size=size)
+        except FileExistsError:
+            log.warning("Shared memory %s already exists, replacing it", self.name)
+            stale = shared_memory.SharedMemory(name=self.name)
+            stale.close()
+            stale.unlink()
+            self.shm = shared_memory.SharedMemory(name=self.name, create=True, size=size)
+        self._ring = np.ndarray(
+            (self.slots, self.height, self.width, 3),
+            dtype=np.uint8,
+            buffer=self.shm.buf,
+            offset=SHM_HEADER_SIZE,
+        )
+        self._write_header(0)
+        return self
+
+    def _write_header(self, seq):
+        SHM_HEADER.pack_into(
+            self.shm.buf, 0, SHM_MAGIC, self.width, self.height, 3, self.slots, seq
+        )
+
+    def send(self, frame):
+        seq = self.frames_sent + 1
+        self._ring[(seq - 1) % self.slots] = frame
+        self._write_header(seq)
+        super().send(frame)
+
+    def close(self):
+        if self.shm is not None:
+            self._ring = None
+            self.shm.close()
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
+            self.shm = None
+
+
+def open_frame_sink(kind, path=None, width=OUT_W, height=OUT_H, fps=FPS, pixel_format="auto"):
+    """Create the (not yet opened) output sink described by `kind`.
+
+    `pixel_format` is one of OUTPUT_FORMATS or "auto" for the sink's native one.
+    """
+    if kind == "vcam":
+        # On Linux, use the v4l2loopback device (FaceCam), /dev/video0 if none is found.
+        # On Windows/macOS, let pyvirtualcam choose the appropriate backend (OBS, etc.).
+        device = None
+        if platform.system() == "Linux":
+            device = find_loopback_device() or "/dev/video0"
+        return VirtualCameraSink(width, height, fps, device=device, pixel_format=pixel_format)
+    if kind == "null":
+        return NullSink(width, height, fps, pixel_format)
+    if kind == "file":
+        if not path:
+            raise ValueError("The file sink needs a path")
+        return FileSink(width, height, fps, path, pixel_format=pixel_format)
+    if kind == "shm":
+        return SharedMemorySink(
+            width, height, fps, name=path or "facecam", pixel_format=pixel_format
+        )
+    raise ValueError(f"Unknown output sink: {kind!r}")
+
+
+def reopen_output(sink, current, wanted, kind, path=None):
+    """Replace `sink`, opened with `current` settings, by one opened with `wanted`.
+
+    Settings are ((width, height), fps, pixel_format). The old sink is closed
+    first, as a virtual camera device cannot be opened twice. If `wanted`
+    cannot be opened, `current` is reopened and written back to the config
+    so the change is not retried on every frame. Returns (sink, settings).
+    """
+    frames_sent = 0
+    if sink is not None:
+        (w, h), fps, fmt = wanted
+        log.info("Reopening %s as %dx%d@%g %s", sink.description, w, h, fps, fmt)
+        frames_sent = sink.frames_sent
+        sink.close()
+    try:
+        (w, h), fps, fmt = wanted
+        new = open_frame_sink(kind, path, w, h, fps, fmt).open()
+    except Exception as e:
+        if current is None:
+            raise
+        log.error("Cannot open the output as %dx%d@%g %s: %s; reverting", w, h, fps, fmt, e)
+        (w, h), fps, fmt = wanted = current
+        new = open_frame_sink(kind, path, w, h, fps, fmt).open()
+        update_config({
+            "output_width": w, "output_height": h, "output_fps": int(fps), "output_format": fmt,
+        })
+    new.frames_sent = frames_sent
+    log.info("Output sink opened: %s", new.description)
+    return new, wanted
+
+
+# ==========================
+# Threaded capture
+# ==========================
+CAPTURE_FAILURE_SLEEP = 0.05        # seconds between reads after a failed one
+CAPTURE_FAILURE_LOG_INTERVAL = 5.0  # seconds between repeated read-failure warnings
+
+
+class LatestFrameReader:
+    """Read frames from a capture device on a dedicated thread.
+
+    Only the newest frame is kept (single-slot mailbox), tagged with a sequence
+    number and the monotonic time it was captured. Readers never block on the
+    device: they get whatever is newest, possibly the same frame as last time.
+
+    Frames are read into buffers from frame_pool. The mailbox holds one
+    reference to the newest frame and read() hands out another, which the
+    caller releases.
+
+    Counters:
+      - dropped: frames overwritten before anyone took them (reader too slow)
+      - reused: frames handed out more than once (camera slower than FPS)
+    """
+
+    def __init__(self, cap, name="CaptureThread"):
+        self.cap = cap
+        self.name = name
+        self._cond = threading.Condition()
+        self._frame = None
+        self._seq = 0
+        self._timestamp = 0.0
+        self._taken_seq = 0
+        self._running = False
+        self._thread = None
+
+        self.captured = 0
+        self.dropped = 0
+        self.reused = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.started_at = 0.0
+        self._failure_log = LogThrottle(CAPTURE_FAILURE_LOG_INTERVAL)
+
+    def start(self):
+        self.started_at = time.monotonic()
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True, name=self.name)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=1.0):
+        """Stop the thread; False if it is still stuck in read() after `timeout`."""
+        self._running = False
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            if self._thread.is_alive():
+                log.warning("%s did not stop within %.1fs", self.name, timeout)
+                return False
+            self._thread = None
+        with self._cond:
+            frame, self._frame = self._frame, None
+        frame_pool.release(frame)
+        return True
+
+    def _run(self):
+        log.debug("%s started", self.name)
+        shape = None
+        while self._running:
+            # Decode into a pooled buffer of the last frame's size.
+            buf = frame_pool.acquire(shape) if shape is not None else None
+            ret, frame = self.cap.read(buf)
+            if not ret or frame is not buf:
+                frame_pool.release(buf)
+            if ret and frame is not buf:
+                frame_pool.adopt(frame)
+                shape = frame.shape
+            buf = None
+            timestamp = self.cap.capture_timestamp or time.monotonic()
+            if not ret:
+                with self._cond:
+                    self.failures += 1
+                    self.consecutive_failures += 1
+                    failures = self.consecutive_failures
+                self._failure_log(
+                    logging.WARNING, "%s: failed to read frame (%d in a row)", self.name, failures
+                )
+                time.sleep(CAPTURE_FAILURE_SLEEP)
+                continue
+
+            with self._cond:
+                self.consecutive_failures = 0
+                if self._frame is not None and self._taken_seq != self._seq:
+                    self.dropped += 1
+                replaced, self._frame = self._frame, frame
+                self._seq += 1
+                self._timestamp = timestamp
+                self.captured += 1
+                self._cond.notify_all()
+            frame_pool.release(replaced)
+            frame = replaced = None
+        log.debug("%s stopped", self.name)
+
+    def read(self, timeout=0.0):
+        """Return (seq, timestamp, frame) for the newest frame.
+
+        The caller owns a reference to `frame` and releases it to frame_pool.
+        Waits up to `timeout` seconds only while no frame has arrived yet;
+        returns (0, 0.0, None) if there is still nothing to hand out.
+        """
+        with self._cond:
+            if self._frame is None and timeout > 0:
+                self._cond.wait_for(lambda: self._frame is not None or not self._running, timeout)
+            if self._frame is None:
+                return 0, 0.0, None
+            if self._taken_seq == self._seq:
+                self.reused += 1
+            self._taken_seq = self._seq
+            return self._seq, self._timestamp, frame_pool.retain(self._frame)
+
+    def wait_first(self, timeout):
+        """Wait up to `timeout` seconds for the first frame; True if one arrived."""
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: self._frame is not None or not self._running, timeout
+            ) and self._frame is not None
+
+    def stats(self):
+        with self._cond:
+            return {
+                "captured": self.captured,
+                "dropped": self.dropped,
+                "reused": self.reused,
+                "failures": self.failures,
+                "drained": getattr(self.cap, "drained", 0),
+            }
+
+SOURCE_WARMUP_TIMEOUT = 5.0  # seconds a new source has to deliver its first frame
+SOURCE_OPEN_TIMEOUT = 10.0   # seconds for the whole open: device, negotiation and warmup
+SOURCE_RETRY_MIN = 0.5       # seconds before the first retry of a failed open...
+SOURCE_RETRY_MAX = 30.0      # ...doubling per failure up to this
+CAPTURE_STALL_TIMEOUT = 1.0  # seconds without a new frame before output holds the last one
+CAPTURE_REOPEN_STALL = 3.0   # seconds without a new frame before the source is reopened
+CAPTURE_REOPEN_FAILURES = 10 # ...or this many failed reads in a row
+
+
+def source_selected(spec):
+    """Whether `spec` (see frame_source_spec) names something to open."""
+    kind, camera_index, path = spec
+    if kind == "camera":
+        return camera_index is not None
+    return kind == "synthetic" or bool(path)
+
+
+class SourceOpener:
+    """Open a frame source on a background thread and warm it up.
+
+    camera_loop keeps streaming from the current source (or the held output
+    frame) meanwhile, and swaps only when done() and `reader` is set, i.e. the
+    new source has delivered a frame. On failure `error` says why and nothing
+    is left open. A cancelled opener releases whatever it opened itself.
+
+    An open still running after `deadline` (e.g. a driver stuck negotiating
+    the mode) counts as failed: done() turns true with `error` set, and the
+    thread releases the source if it ever gets one.
+    """
+
+    def __init__(self, spec, realtime=True, capture_key=None, capture_mode=None,
+                 low_latency=False, output_size=None, fps=None, warmup=SOURCE_WARMUP_TIMEOUT,
+                 deadline=SOURCE_OPEN_TIMEOUT):
+        self.spec = spec
+        self.realtime = realtime
+        self.capture_key = capture_key
+        self.capture_mode = capture_mode
+        self.low_latency = low_latency
+        self.output_size = output_size
+        self.fps = fps
+        self.warmup = warmup
+        self.deadline = deadline
+        self.cap = None
+        self.reader = None
+        self.error = None
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._cancelled = False
+        threading.Thread(target=self._run, daemon=True, name=f"Open-{spec[0]}").start()
+
+    @staticmethod
+    def _close(cap, reader):
+        if reader is not None and not reader.stop():
+            # Releasing under a thread blocked in read() can crash the
+            # backend; leave the handle to that thread instead.
+            log.warning("Not releasing %s: its reader is still blocked", reader.name)
+            return
+        if cap is not None:
+            cap.release()
+
+    def _run(self):
+        cap = reader = None
+        error = None
+        try:
+            cap = open_frame_source(
+                *self.spec, realtime=self.realtime, capture_mode=self.capture_mode,
+                low_latency=self.low_latency, output_size=self.output_size, fps=self.fps,
+            )
+            if cap is None:
+                error = "nothing to open"
+            elif not cap.isOpened():
+                error = "could not be opened"
+            else:
+                reader = LatestFrameReader(cap, name=f"Capture-{self.spec[0]}").start()
+                if not reader.wait_first(self.warmup):
+                    error = f"no frame within {self.warmup:.1f}s"
+        except Exception as e:
+            error = str(e) or type(e).__name__
+        if error is not None:
+            self._close(cap, reader)
+            cap = reader = None
+
+        with self._lock:
+            cancelled = self._cancelled
+            if not cancelled:
+                self.cap, self.reader, self.error = cap, reader, error
+            self._done.set()
+        if cancelled:
+            self._close(cap, reader)
+
+    def done(self):
+        if self._done.is_set():
+            return True
+        if time.monotonic() - self.started < self.deadline:
+            return False
+        with self._lock:
+            if not self._done.is_set():
+                self._cancelled = True
+                self.error = f"not opened within {self.deadline:.1f}s"
+                self._done.set()
+        return True
+
+    def cancel(self):
+        """Abandon the open; safe to call at any point."""
+        with self._lock:
+            self._cancelled = True
+            cap, reader = self.cap, self.reader
+            self.cap = self.reader = None
+        self._close(cap, reader)
+
+class CaptureHealth:
+    """Degraded-state bookkeeping and counters for camera_loop.
+
+    The loop is degraded while a source is selected but no fresh frames reach
+    the output (stalled capture, reopen in progress). `open_failures` counts
+    failed opens in a row and drives the exponential retry backoff.
+    """
+
+    def __init__(self):
+        self.degraded_since = None
+        self.degraded_total = 0.0
+        self.reopens = 0
+        self.open_failures = 0
+        self.open_log = LogThrottle(CAPTURE_FAILURE_LOG_INTERVAL)
+
+    @property
+    def degraded(self):
+        return self.degraded_since is not None
+
+    def degrade(self, now):
+        """Enter the degraded state; True if it was not degraded before."""
+        if self.degraded_since is not None:
+            return False
+        self.degraded_since = now
+        return True
+
+    def recover(self, now):
+        """Leave the degraded state; returns how long it lasted (0 if it was not)."""
+        if self.degraded_since is None:
+            return 0.0
+        duration = now - self.degraded_since
+        self.degraded_total += duration
+        self.degraded_since = None
+        return duration
+
+    def retry_delay(self):
+        return min(SOURCE_RETRY_MAX, SOURCE_RETRY_MIN * 2 ** max(0, self.open_failures - 1))
+
+    def stats(self, now):
+        degraded = self.degraded_total
+        if self.degraded_since is not None:
+            degraded += now - self.degraded_since
+        return {
+            "capture_degraded": self.degraded,
+            "capture_degraded_seconds": round(degraded, 1),
+            "capture_reopens": self.reopens,
+            "capture_open_failures": self.open_failures,
+        }
+
+
+def placeholder_frame(width=OUT_W, height=OUT_H, text="No signal"):
+    """Dark BGR frame sent while no source has produced any output yet."""
+    frame = np.full((height, width, 3), 24, np.uint8)
+    font = cv2.FONT_HERSHEY_SIMPLEX
+    (tw, th), _ = cv2.getTextSize(text, font, 1.0, 2)
+    cv2.putText(frame, text, ((width - tw) // 2, (height + th) // 2), font, 1.0,
+                (160, 160, 160), 2, cv2.LINE_AA)
+    return frame
 
 # ==========================
 # Video / face tracking loop
 # ==========================
-def apply_orientation(frame, orientation):
+ROTATE_CODES = {"cw": cv2.ROTATE_90_CLOCKWISE, "ccw": cv2.ROTATE_90_COUNTERCLOCKWISE}
+
+
+def pooled_orientation(frame, orientation):
+    """Rotate `frame` by `orientation` (see ROTATE_CODES) into a buffer from
+    frame_pool, which the caller releases; without rotation that is `frame`
+    itself, retained."""
+    code = ROTATE_CODES.get(orientation)
+    if code is None:
+        return frame_pool.retain(frame)
+    h, w = frame.shape[:2]
+    dst = frame_pool.acquire((w, h) + frame.shape[2:], frame.dtype)
+    return cv2.rotate(frame, code, dst=dst)
+
+
+def oriented_size(width, height, orientation):
+    """(width, height) of a width x height frame after pooled_orientation."""
+    return (height, width) if orientation in ROTATE_CODES else (width, height)
+
+
+def oriented_region(frame, orientation, rect):
+    """Slice of the captured `frame` that pooled_orientation turns into `rect`.
+
+    `rect` is (x, y, w, h) in oriented coordinates. Rotating the returned
+    view with pooled_orientation gives exactly that part of the oriented
+    frame, so only the region has to be rotated, not the whole frame.
+    """
+    x, y, w, h = rect
+    h_f, w_f = frame.shape[:2]
+    if orientation == "cw":
+        return frame[h_f - x - w:h_f - x, y:y + h]
+    if orientation == "ccw":
+        return frame[x:x + w, w_f - y - h:w_f - y]
+    return frame[y:y + h, x:x + w]
+
+def crop_transform(rect, out_size, src_size, orientation="none", mirror=False):
+    """Affine map from output pixels to source pixels, for WARP_INVERSE_MAP.
+
+    `rect` is the (x, y, w, h) crop in the oriented frame, in float pixels,
+    so panning moves smoothly by fractions of a pixel. `src_size` is the
+    (width, height) of the frame as captured; `orientation` ("none", "cw",
+    "ccw") says how it is rotated into the oriented frame. `mirror` flips
+    the output horizontally. Pixel centres, not corners, are aligned.
+    """
+    x, y, w, h = rect
+    out_w, out_h = out_size
+    src_w, src_h = src_size
+    sx, sy = w / out_w, h / out_h
+    m = np.array([
+        [sx, 0.0, x + 0.5 * sx - 0.5],
+        [0.0, sy, y + 0.5 * sy - 0.5],
+        [0.0, 0.0, 1.0],
+    ])
+    if mirror:
+        m = m @ np.array([[-1.0, 0.0, out_w - 1.0], [0.0, 1.0, 0.0], [0.0, 0.0, 1.0]])
     if orientation == "cw":
-        return cv2.rotate(frame, cv2.ROTATE_90_CLOCKWISE)
+        # ROTATE_90_CLOCKWISE: oriented (u, v) is captured (v, src_h - 1 - u)
+        m = np.array([[0.0, 1.0, 0.0], [-1.0, 0.0, src_h - 1.0], [0.0, 0.0, 1.0]]) @ m
     elif orientation == "ccw":
-        return cv2.rotate(frame, cv2.ROTATE_90_COUNTERCLOCKWISE)
-    return frame
+        # ROTATE_90_COUNTERCLOCKWISE: oriented (u, v) is captured (src_w - 1 - v, u)
+        m = np.array([[0.0, -1.0, src_w - 1.0], [1.0, 0.0, 0.0], [0.0, 0.0, 1.0]]) @ m
+    return m[:2]
 
-def camera_loop():
-    log.info("Starting camera_loop")
-    face_cascade = cv2.CascadeClassifier(
-        cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
-    )
-    if face_cascade.empty():
-        log.error("Failed to load Haar cascade for face detection")
 
-    smooth_cx = smooth_cy = smooth_size = None
-    frame_idx = 0
-    current_cam_index = None
-    cap = None
+COMPOSE_MAX_SCALE = 2.0  # source px per output px warpAffine samples directly
+COMPOSE_ALIGN = 64       # reduced regions are snapped to this grid to keep pool shapes few
 
-    # On Linux, explicitly use /dev/video0 (FaceCam loopback).
-    # On Windows/macOS, let pyvirtualcam choose the appropriate backend (OBS, etc.).
-    if platform.system() == "Linux":
-        vcam_device = "/dev/video0"
-    else:
-        vcam_device = None
 
-    log.info("Initializing virtual camera, device=%s", vcam_device)
+def reduce_for_compose(frame, matrix, out_size):
+    """Shrink the part of `frame` that `matrix` reads until it is at most
+    COMPOSE_MAX_SCALE source pixels per output pixel.
+
+    Bilinear warpAffine samples 2x2 pixels per output pixel, so a stronger
+    downscale skips source pixels and aliases. Each level averages 2x2
+    blocks (INTER_AREA at exactly half size, several times cheaper than
+    pyrDown); returns the reduced image, a frame_pool buffer the caller
+    releases (or `frame` itself if nothing was reduced), and `matrix`
+    adjusted to it.
+    """
+    sx = np.hypot(matrix[0, 0], matrix[1, 0])
+    sy = np.hypot(matrix[0, 1], matrix[1, 1])
+    levels = 0
+    while min(sx, sy) / (1 << levels) > COMPOSE_MAX_SCALE:
+        levels += 1
+    if levels == 0:
+        return frame, matrix
+    out_w, out_h = out_size
+    corners = np.array([[0.0, 0.0, 1.0], [out_w, 0.0, 1.0], [0.0, out_h, 1.0], [out_w, out_h, 1.0]])
+    pts = corners @ matrix.T
+    pad = 2 << levels  # the box filters and the bilinear tap reach past the corners
+    h, w = frame.shape[:2]
+    x0 = max(0, (int(pts[:, 0].min()) - pad) // COMPOSE_ALIGN * COMPOSE_ALIGN)
+    y0 = max(0, (int(pts[:, 1].min()) - pad) // COMPOSE_ALIGN * COMPOSE_ALIGN)
+    x1 = min(w, -(-(int(pts[:, 0].max()) + pad) // COMPOSE_ALIGN) * COMPOSE_ALIGN)
+    y1 = min(h, -(-(int(pts[:, 1].max()) + pad) // COMPOSE_ALIGN) * COMPOSE_ALIGN)
+    # Whole blocks only, so every level is an exact halving.
+    x1 = x0 + ((x1 - x0) >> levels << levels)
+    y1 = y0 + ((y1 - y0) >> levels << levels)
+    if x1 <= x0 or y1 <= y0:
+        return frame, matrix
+    region = frame[y0:y1, x0:x1]
+    matrix = matrix.copy()
+    matrix[:, 2] -= (x0, y0)
+    for level in range(levels):
+        h, w = region.shape[:2]
+        dst = frame_pool.acquire((h // 2, w // 2) + region.shape[2:])
+        reduced = cv2.resize(region, (w // 2, h // 2), dst=dst, interpolation=cv2.INTER_AREA)
+        if level:
+            frame_pool.release(region)
+        region = reduced
+        # Reduced pixel j averages pixels 2j and 2j + 1.
+        matrix *= 0.5
+        matrix[:, 2] -= 0.25
+    return region, matrix
+
 
+def compose(frame, matrix, out, interpolation=cv2.INTER_LINEAR):
+    """Crop, scale, rotate and mirror `frame` into `out` in one warpAffine pass.
+
+    Bilinear is kept for every output size: INTER_CUBIC costs 6-7x as much
+    per output pixel. Strong downscales go through reduce_for_compose first.
+    """
+    region, matrix = reduce_for_compose(frame, matrix, (out.shape[1], out.shape[0]))
     try:
-        with pyvirtualcam.Camera(
-            width=OUT_W,
-            height=OUT_H,
-            fps=FPS,
-            device=vcam_device,
-            print_fps=True,
-        ) as vcam:
-            log.info("Virtual camera opened: %s", vcam.device)
-            log.info("Open http://127.0.0.1:5000 to configure.")
-            log.info("Select this virtual camera in Zoom/Meet/etc.")
+        return cv2.warpAffine(
+            region, matrix, (out.shape[1], out.shape[0]), dst=out,
+            flags=interpolation | cv2.WARP_INVERSE_MAP, borderMode=cv2.BORDER_REPLICATE,
+        )
+    finally:
+        if region is not frame:
+            frame_pool.release(region)
 
-            while True:
-                cfg = get_config()
-
-                if cfg["camera_index"] != current_cam_index:
-                    if cap is not None:
-                        log.info("Releasing previous capture device index %s", current_cam_index)
-                        cap.release()
-                        cap = None
-                    current_cam_index = cfg["camera_index"]
-                    smooth_cx = smooth_cy = smooth_size = None
-                    frame_idx = 0
-
-                    if current_cam_index is None:
-                        log.debug("No camera_index selected yet, sleeping...")
-                        time.sleep(0.1)
-                        continue
-
-                    log.info("Opening capture device index %s", current_cam_index)
-                    cap = cv2.VideoCapture(current_cam_index)
-                    cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-                    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
-                    cap.set(cv2.CAP_PROP_FPS, FPS)
-
-                    if not cap.isOpened():
-                        log.error("Failed to open capture device index %s", current_cam_index)
-                        cap = None
-                        time.sleep(1.0)
-                        continue
-
-                if cap is None:
-                    time.sleep(0.1)
-                    continue
+def frame_source_spec(cfg, overrides=None):
+    """Return (kind, camera_index, path) for the source camera_loop should use.
 
-                ret, frame = cap.read()
-                if not ret:
-                    log.warning("Failed to read frame from camera index %s", current_cam_index)
-                    time.sleep(0.05)
+    `overrides` (from the command line) take precedence over the config.
+    """
+    overrides = overrides or {}
+    kind = overrides.get("source") or cfg.get("source") or "camera"
+    path = overrides.get("source_path") or cfg.get("source_path")
+    if kind == "camera":
+        return kind, cfg.get("camera_index"), None
+    return kind, None, path
+
+def describe_source(spec):
+    kind, camera_index, path = spec
+    if kind == "camera":
+        return f"camera index {camera_index}"
+    if kind == "synthetic":
+        return "synthetic source"
+    return f"{kind} source {path}"
+
+class StageTimings:
+    """Per-stage durations (seconds) collected while the pipeline runs."""
+
+    def __init__(self):
+        self.samples = {}
+
+    def add(self, stage, seconds):
+        self.samples.setdefault(stage, []).append(seconds)
+
+    def summary(self):
+        result = {}
+        for stage, values in self.samples.items():
+            ms = np.asarray(values) * 1000.0
+            p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+            result[stage] = {
+                "count": len(values),
+                "mean_ms": float(ms.mean()),
+                "p50_ms": float(p50),
+                "p95_ms": float(p95),
+                "p99_ms": float(p99),
+                "max_ms": float(ms.max()),
+            }
+        return result
+
+
+# Smallest face (px, in the detection image) worth asking a detector for.
+MIN_DETECTION_SIZE = 24
+MIN_DETECTION_WIDTH = 80
+# ROI detection: search window side relative to the last face, and the range
+# of face sizes (relative to the last face) the detector is asked for.
+ROI_SEARCH_FACTOR = 2.5
+ROI_MIN_FACE_RATIO = 0.6
+ROI_MAX_FACE_RATIO = 1.6
+ROI_ALIGN = 32  # px; window sides are rounded up to this so ROI crops reuse pooled buffers
+
+MODELS_DIR = BASE_DIR / "models"
+DETECTORS = ("haar", "lbp", "yunet", "ssd")
+
+
+class FaceDetector:
+    """Base class for face detection backends.
+
+    detect() handles what all backends share: cutting out the ROI, scaling to
+    the detection width and mapping rects back to full-frame coordinates.
+    Subclasses implement _prepare() (region -> detector input image, which
+    the caller releases to frame_pool) and _detect() (image -> rects in
+    image coordinates). DEFAULT_PARAMS lists
+    each backend's tunables; they live in config["detector_params"][name].
+    """
+
+    DEFAULT_PARAMS = {}
+
+    def __init__(self, params):
+        self.params = dict(self.DEFAULT_PARAMS, **(params or {}))
+
+    def _prepare(self, region, scale):
+        raise NotImplementedError
+
+    def _detect(self, image, min_side, max_side):
+        raise NotImplementedError
+
+    def detect(self, frame, detection_width=0, roi=None, orientation="none"):
+        """Detect faces, returning (x, y, w, h) rects in full-frame coordinates.
+
+        When `detection_width` is smaller than the frame, the backend runs on a
+        copy downscaled to that width and the rects are scaled back.
+
+        `roi` = (x, y, w, h, face_size) restricts the search to that window of
+        the frame and only looks for faces of roughly `face_size` px.
+
+        `orientation` is applied to the small prepared image rather than to
+        the captured frame; `roi`, `detection_width` and the returned rects all
+        refer to the oriented frame.
+        """
+        w_f, _ = oriented_size(frame.shape[1], frame.shape[0], orientation)
+        scale = detection_width / w_f if 0 < detection_width < w_f else 1.0
+        if roi is not None:
+            x0, y0, rw, rh, face_size = roi
+            frame = oriented_region(frame, orientation, (x0, y0, rw, rh))
+            expected = face_size * scale
+            min_side = max(MIN_DETECTION_SIZE, int(expected * ROI_MIN_FACE_RATIO))
+            max_side = max(min_side + 1, int(expected * ROI_MAX_FACE_RATIO))
+        else:
+            x0 = y0 = 0
+            min_side = max(MIN_DETECTION_SIZE, int(round(self.params.get("min_size", 0) * scale)))
+            max_side = 0  # no upper bound
+
+        prepared = self._prepare(frame, scale)
+        image = pooled_orientation(prepared, orientation)
+        frame_pool.release(prepared)
+        try:
+            faces = self._detect(image, min_side, max_side)
+        finally:
+            frame_pool.release(image)
+        if len(faces) > 0 and (scale != 1.0 or x0 or y0):
+            faces = np.round(np.asarray(faces) / scale).astype(int)
+            faces[:, 0] += x0
+            faces[:, 1] += y0
+        return faces
+
+    @staticmethod
+    def _resize(image, scale):
+        if scale == 1.0:
+            return frame_pool.retain(image)
+        h_r, w_r = image.shape[:2]
+        return pooled_resize(
+            image, (max(1, int(round(w_r * scale))), max(1, int(round(h_r * scale))))
+        )
+
+
+class CascadeDetector(FaceDetector):
+    """cv2.CascadeClassifier backend (Haar or LBP features)."""
+
+    def __init__(self, params):
+        super().__init__(params)
+        self.cascade = cv2.CascadeClassifier(str(self.params["model_path"]))
+        if self.cascade.empty():
+            raise ValueError(f"Failed to load cascade {self.params['model_path']}")
+        window = self.cascade.getOriginalWindowSize()
+        self.window = max(window) if window else MIN_DETECTION_SIZE
+
+    def _prepare(self, region, scale):
+        # Convert first: resizing one channel is cheaper than three.
+        gray = pooled_gray(region)
+        try:
+            return self._resize(gray, scale)
+        finally:
+            frame_pool.release(gray)
+
+    def _detect(self, image, min_side, max_side):
+        min_side = max(min_side, self.window)
+        if max_side:
+            max_side = max(max_side, min_side + 1)
+        return self.cascade.detectMultiScale(
+            image,
+            scaleFactor=float(self.params["scale_factor"]),
+            minNeighbors=int(self.params["min_neighbors"]),
+            minSize=(min_side, min_side),
+            maxSize=(max_side, max_side),
+        )
+
+
+class HaarDetector(CascadeDetector):
+    DEFAULT_PARAMS = {
+        "model_path": cv2.data.haarcascades + "haarcascade_frontalface_default.xml",
+        "scale_factor": 1.3,
+        "min_neighbors": 5,
+        "min_size": 60,
+    }
+
+
+class LbpDetector(CascadeDetector):
+    """LBP cascade: a few times faster than Haar, somewhat less accurate.
+
+    opencv-python doesn't ship LBP cascades; download
+    lbpcascade_frontalface_improved.xml from the OpenCV repo into models/.
+    """
+
+    DEFAULT_PARAMS = {
+        "model_path": str(MODELS_DIR / "lbpcascade_frontalface_improved.xml"),
+        "scale_factor": 1.2,
+        "min_neighbors": 4,
+        "min_size": 60,
+    }
+
+
+class YuNetDetector(FaceDetector):
+    """cv2.FaceDetectorYN (YuNet ONNX model) on the CPU."""
+
+    DEFAULT_PARAMS = {
+        "model_path": str(MODELS_DIR / "face_detection_yunet_2023mar.onnx"),
+        "score_threshold": 0.8,
+        "nms_threshold": 0.3,
+        "top_k": 50,
+        "min_size": 40,
+    }
+
+    def __init__(self, params):
+        super().__init__(params)
+        if not Path(self.params["model_path"]).is_file():
+            raise ValueError(f"YuNet model not found: {self.params['model_path']}")
+        self.net = cv2.FaceDetectorYN_create(
+            str(self.params["model_path"]),
+            "",
+            (320, 320),
+            float(self.params["score_threshold"]),
+            float(self.params["nms_threshold"]),
+            int(self.params["top_k"]),
+        )
+        self._input_size = (320, 320)
+
+    def _prepare(self, region, scale):
+        return self._resize(region, scale)
+
+    def _detect(self, image, min_side, max_side):
+        size = (image.shape[1], image.shape[0])
+        if size != self._input_size:
+            self.net.setInputSize(size)
+            self._input_size = size
+        _, faces = self.net.detect(image)
+        if faces is None:
+            return ()
+        rects = faces[:, :4].astype(int)
+        sides = np.maximum(rects[:, 2], rects[:, 3])
+        keep = sides >= min_side
+        if max_side:
+            keep &= sides <= max_side
+        return rects[keep]
+
+
+class SsdDetector(FaceDetector):
+    """OpenCV DNN res10 300x300 SSD (Caffe) on the CPU."""
+
+    DEFAULT_PARAMS = {
+        "model_path": str(MODELS_DIR / "res10_300x300_ssd_iter_140000.caffemodel"),
+        "config_path": str(MODELS_DIR / "deploy.prototxt"),
+        "confidence": 0.6,
+        "input_size": 300,
+        "min_size": 40,
+    }
+
+    def __init__(self, params):
+        super().__init__(params)
+        for key in ("model_path", "config_path"):
+            if not Path(self.params[key]).is_file():
+                raise ValueError(f"SSD {key} not found: {self.params[key]}")
+        self.net = cv2.dnn.readNetFromCaffe(
+            str(self.params["config_path"]), str(self.params["model_path"])
+        )
+        self.net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+        self.net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+
+    def _prepare(self, region, scale):
+        return self._resize(region, scale)
+
+    def _detect(self, image, min_side, max_side):
+        h_i, w_i = image.shape[:2]
+        side = int(self.params["input_size"])
+        blob = cv2.dnn.blobFromImage(image, 1.0, (side, side), (104.0, 177.0, 123.0))
+        self.net.setInput(blob)
+        detections = self.net.forward()[0, 0]
+        detections = detections[detections[:, 2] >= float(self.params["confidence"])]
+        if len(detections) == 0:
+            return ()
+        boxes = detections[:, 3:7] * np.array([w_i, h_i, w_i, h_i])
+        x1, y1 = np.clip(boxes[:, 0], 0, w_i), np.clip(boxes[:, 1], 0, h_i)
+        x2, y2 = np.clip(boxes[:, 2], 0, w_i), np.clip(boxes[:, 3], 0, h_i)
+        rects = np.stack([x1, y1, x2 - x1, y2 - y1], axis=1).astype(int)
+        sides = np.maximum(rects[:, 2], rects[:, 3])
+        keep = sides >= min_side
+        if max_side:
+            keep &= sides <= max_side
+        return rects[keep]
+
+
+DETECTOR_CLASSES = {
+    "haar": HaarDetector,
+    "lbp": LbpDetector,
+    "yunet": YuNetDetector,
+    "ssd": SsdDetector,
+}
+
+
+def make_face_detector(spec):
+    """Build the detector for `spec` (see detector_spec), falling back to Haar."""
+    name, params = spec
+    try:
+        return DETECTOR_CLASSES[name](dict(params))
+    except (KeyError, ValueError, cv2.error) as e:
+        log.error("Failed to create %s face detector (%s); falling back to haar", name, e)
+        return HaarDetector({})
+
+
+# Valid ranges for numeric detector params; values outside are rejected
+# rather than handed to OpenCV, which may assert inside detect().
+DETECTOR_PARAM_RANGES = {
+    "scale_factor": (lambda v: v > 1, "> 1"),
+    "min_neighbors": (lambda v: v >= 0, ">= 0"),
+    "min_size": (lambda v: v >= 0, ">= 0"),
+    "score_threshold": (lambda v: 0 < v <= 1, "in (0, 1]"),
+    "nms_threshold": (lambda v: 0 < v <= 1, "in (0, 1]"),
+    "confidence": (lambda v: 0 < v <= 1, "in (0, 1]"),
+    "top_k": (lambda v: v > 0, "> 0"),
+    "input_size": (lambda v: v > 0, "> 0"),
+}
+
+
+def coerce_detector_params(data, current):
+    """Merge a POSTed detector_params dict into `current`, keeping known keys
+    with the type of their defaults and values in DETECTOR_PARAM_RANGES.
+    Returns the merged dict."""
+    merged = {name: dict(params) for name, params in (current or {}).items()}
+    if not isinstance(data, dict):
+        return merged
+    for name, params in data.items():
+        cls = DETECTOR_CLASSES.get(name)
+        if cls is None or not isinstance(params, dict):
+            continue
+        for key, value in params.items():
+            default = cls.DEFAULT_PARAMS.get(key)
+            if default is None:
+                continue
+            try:
+                value = type(default)(value)
+            except (TypeError, ValueError, OverflowError):
+                log.warning("Invalid %s detector param %s: %s", name, key, value)
+                continue
+            check, expected = DETECTOR_PARAM_RANGES.get(key, (None, None))
+            if check is not None and not check(value):
+                log.warning("Invalid %s detector param %s: %s (must be %s)", name, key, value, expected)
+                continue
+            merged.setdefault(name, {})[key] = value
+    return merged
+
+
+DetectionResult = namedtuple(
+    "DetectionResult", "seq frame_idx timestamp roi faces duration"
+)
+
+
+class DetectionWorker:
+    """Run face detection on a background thread.
+
+    submit() puts a frame into a single-slot mailbox, replacing any frame the
+    worker has not picked up yet; the worker holds a frame_pool reference to
+    it until detection on it is done. The worker detects on the newest frame and
+    publishes a DetectionResult; the render loop polls latest() and never
+    waits for detection. clear() discards pending and in-flight work (e.g.
+    after switching sources).
+    """
+
+    def __init__(self, name="DetectionThread"):
+        self.name = name
+        self.detector = None
+        self._detector_spec = None
+        self._cond = threading.Condition()
+        self._pending = None
+        self._result = None
+        self._generation = 0
+        self._running = False
+        self._thread = None
+
+        self.completed = 0
+        self.skipped = 0
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True, name=self.name)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=1.0):
+        self._running = False
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self._drop_pending()
+
+    def _drop_pending(self):
+        with self._cond:
+            pending, self._pending = self._pending, None
+        if pending is not None:
+            frame_pool.release(pending[0])
+
+    def submit(self, frame, frame_idx, timestamp, spec, detection_width, roi=None,
+               orientation="none"):
+        frame_pool.retain(frame)
+        with self._cond:
+            replaced = self._pending
+            if replaced is not None:
+                self.skipped += 1
+            self._pending = (frame, frame_idx, timestamp, spec, detection_width, roi, orientation)
+            self._cond.notify_all()
+        if replaced is not None:
+            frame_pool.release(replaced[0])
+
+    def clear(self):
+        self._drop_pending()
+        with self._cond:
+            self._result = None
+            self._generation += 1
+
+    def latest(self):
+        with self._cond:
+            return self._result
+
+    def _run(self):
+        log.debug("%s started", self.name)
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending is not None or not self._running)
+                if not self._running:
+                    break
+                (frame, frame_idx, timestamp, spec, detection_width, roi,
+                 orientation) = self._pending
+                self._pending = None
+                generation = self._generation
+
+            if spec != self._detector_spec:
+                self._detector_spec = spec
+                self.detector = make_face_detector(spec)
+                log.info("%s: using %s face detector", self.name, spec[0])
+
+            start = time.perf_counter()
+            try:
+                faces = self.detector.detect(frame, detection_width, roi, orientation)
+            except cv2.error:
+                log.exception("%s: face detection failed", self.name)
+                continue
+            finally:
+                frame_pool.release(frame)
+                frame = None
+            duration = time.perf_counter() - start
+
+            with self._cond:
+                if generation != self._generation:
                     continue
+                seq = self._result.seq + 1 if self._result is not None else 1
+                self._result = DetectionResult(seq, frame_idx, timestamp, roi, faces, duration)
+                self.completed += 1
+        log.debug("%s stopped", self.name)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "completed": self.completed,
+                "skipped": self.skipped,
+                "last_ms": self._result.duration * 1000.0 if self._result else None,
+            }
+
+
+class FaceTracker:
+    """Base class for cheap per-frame trackers run between detections.
+
+    init() starts tracking a face rect (full-frame coordinates) on a frame;
+    update() follows it on the next frame and returns the new rect, or None
+    once the track is lost. Trackers work on a copy of the frame downscaled
+    to `width` px to keep the per-frame cost low. Frames are passed as
+    captured; `orientation` is applied to the downscaled copy, and rects are
+    in oriented coordinates.
+    """
+
+    def __init__(self, width=0, orientation="none"):
+        self.width = width
+        self.orientation = orientation
+        self.scale = 1.0
+        self.active = False
+
+    def _prepare(self, frame):
+        """Downscaled, oriented copy of `frame`; the caller releases it."""
+        h_f, w_f = frame.shape[:2]
+        o_w, _ = oriented_size(w_f, h_f, self.orientation)
+        self.scale = self.width / o_w if 0 < self.width < o_w else 1.0
+        if self.scale == 1.0:
+            return pooled_orientation(frame, self.orientation)
+        small = pooled_resize(
+            frame, (max(1, int(round(w_f * self.scale))), max(1, int(round(h_f * self.scale))))
+        )
+        oriented = pooled_orientation(small, self.orientation)
+        frame_pool.release(small)
+        return oriented
+
+    def reset(self):
+        self.active = False
+
+    def init(self, frame, rect):
+        raise NotImplementedError
+
+    def update(self, frame):
+        raise NotImplementedError
 
-                frame_idx += 1
 
-                frame = apply_orientation(frame, cfg["orientation"])
+class LucasKanadeTracker(FaceTracker):
+    """Sparse Lucas-Kanade optical flow on corners inside the face rect.
 
-                det_n = max(1, int(cfg["detection_every_n_frames"]))
-                alpha = float(cfg["smoothing_alpha"])
-                margin = float(cfg["margin_factor"])
+    The rect follows the median point displacement and scales with the median
+    change in the points' spread around their centroid.
+    """
+
+    MAX_CORNERS = 40
+    MIN_POINTS = 6
+
+    def __init__(self, width=0, orientation="none"):
+        super().__init__(width, orientation)
+        self._prev = None
+        self._points = None
+        self._rect = None
+
+    def reset(self):
+        super().reset()
+        frame_pool.release(self._prev)
+        self._prev = None
+
+    def _gray(self, frame):
+        prepared = self._prepare(frame)
+        gray = pooled_gray(prepared)
+        frame_pool.release(prepared)
+        return gray
+
+    def init(self, frame, rect):
+        gray = self._gray(frame)
+        x, y, w, h = (v * self.scale for v in rect)
+        mask = np.zeros_like(gray)
+        # Inner part of the rect: corners there are on the face, not the background.
+        cv2.rectangle(
+            mask,
+            (int(x + w * 0.2), int(y + h * 0.15)),
+            (int(x + w * 0.8), int(y + h * 0.9)),
+            255, -1,
+        )
+        points = cv2.goodFeaturesToTrack(
+            gray, maxCorners=self.MAX_CORNERS, qualityLevel=0.01, minDistance=4, mask=mask
+        )
+        self.active = points is not None and len(points) >= self.MIN_POINTS
+        frame_pool.release(self._prev)
+        self._prev = gray  # kept for the next update()
+        self._points = points
+        self._rect = (x, y, w, h)
+
+    def update(self, frame):
+        if not self.active:
+            return None
+        gray = self._gray(frame)
+        if gray.shape != self._prev.shape:
+            frame_pool.release(gray)
+            self.active = False
+            return None
+        new_points, status, _ = cv2.calcOpticalFlowPyrLK(
+            self._prev, gray, self._points, None, winSize=(15, 15), maxLevel=2
+        )
+        frame_pool.release(self._prev)
+        self._prev = gray
+        good = status.reshape(-1) == 1
+        old = self._points.reshape(-1, 2)[good]
+        new = new_points.reshape(-1, 2)[good]
+        if len(new) < self.MIN_POINTS:
+            self.active = False
+            return None
+
+        dx, dy = np.median(new - old, axis=0)
+        old_spread = np.linalg.norm(old - old.mean(axis=0), axis=1)
+        new_spread = np.linalg.norm(new - new.mean(axis=0), axis=1)
+        valid = old_spread > 1e-3
+        ds = float(np.median(new_spread[valid] / old_spread[valid])) if valid.any() else 1.0
+
+        x, y, w, h = self._rect
+        cx, cy = x + w / 2 + dx, y + h / 2 + dy
+        w, h = w * ds, h * ds
+        self._rect = (cx - w / 2, cy - h / 2, w, h)
+        self._points = new.reshape(-1, 1, 2)
+        return tuple(int(round(v / self.scale)) for v in self._rect)
+
+
+class OpenCVTracker(FaceTracker):
+    """Wrapper around the cv2.Tracker* family (MIL, KCF, MOSSE, CSRT)."""
+
+    def __init__(self, factory, width=0, orientation="none"):
+        super().__init__(width, orientation)
+        self.factory = factory
+        self._tracker = None
+
+    def init(self, frame, rect):
+        small = self._prepare(frame)
+        x, y, w, h = (int(round(v * self.scale)) for v in rect)
+        self._tracker = self.factory()
+        try:
+            self._tracker.init(small, (x, y, w, h))  # the tracker keeps its own model, not the image
+        finally:
+            frame_pool.release(small)
+        self.active = True
+
+    def update(self, frame):
+        if not self.active:
+            return None
+        small = self._prepare(frame)
+        try:
+            ok, rect = self._tracker.update(small)
+        finally:
+            frame_pool.release(small)
+        if not ok:
+            self.active = False
+            return None
+        return tuple(int(round(v / self.scale)) for v in rect)
+
+
+def opencv_tracker_factory(name):
+    """Return the cv2 constructor for tracker `name`, or None if unavailable.
+
+    KCF, MOSSE and CSRT ship with opencv-contrib-python only; MIL is in core.
+    """
+    for module in (cv2, getattr(cv2, "legacy", None)):
+        factory = getattr(module, f"Tracker{name}_create", None) if module else None
+        if factory is not None:
+            return factory
+    return None
+
+
+TRACKERS = ("none", "lk", "mil", "kcf", "mosse", "csrt")
+
+
+def make_tracker(kind, width=0, orientation="none"):
+    """Create the tracker named `kind`; None for "none" or if unavailable."""
+    if kind == "lk":
+        return LucasKanadeTracker(width, orientation)
+    if kind in ("mil", "kcf", "mosse", "csrt"):
+        factory = opencv_tracker_factory(kind.upper())
+        if factory is None:
+            log.warning("Tracker %s is not available in this OpenCV build (needs opencv-contrib-python)", kind)
+            return None
+        return OpenCVTracker(factory, width, orientation)
+    return None
+
+
+class CropPipeline:
+    """Per-frame face tracking and cropping.
+
+    Stages: detect (every N frames) -> smooth -> compose (crop, scale, rotate
+    and mirror in one warp) -> convert (BGR to the sink's pixel format, skipped
+    for BGR sinks). Pass a StageTimings
+    to record how long each stage takes; "total" covers the whole call.
+
+    With a DetectionWorker and the async_detection config on, detection ticks
+    only hand the frame to the worker, and smoothing picks up whichever result
+    the worker published last.
+
+    With roi_detection on, detection searches a window around the last face
+    found and falls back to a full-frame scan after roi_max_misses empty ROI
+    scans in a row, and every roi_full_scan_every detections regardless.
+
+    A tracker (config "tracker") follows the face on every frame in between,
+    feeding its rect into smoothing; each detection re-initialises it.
+    """
+
+    def __init__(self, timings=None, detection_worker=None):
+        self.detector = None
+        self._detector_spec = None
+        self.timings = timings
+        self.detection_worker = detection_worker
+        self.stats = {}
+        self._orientation = "none"
+        self.tracker = None
+        self._detect_log = LogThrottle(CAPTURE_FAILURE_LOG_INTERVAL)
+        self.reset()
+
+    def reset(self):
+        self.smooth_cx = self.smooth_cy = self.smooth_size = None
+        self.frame_idx = 0
+        self.last_face = None
+        self._result_seq = 0
+        self._roi_misses = 0
+        self._scans_since_full = 0
+        if self.tracker is not None:
+            self.tracker.reset()  # lets go of its pooled buffers
+        self.tracker = None
+        self._tracker_key = None
+        if self.detection_worker is not None:
+            self.detection_worker.clear()
+
+    def _lap(self, stage, start):
+        now = time.perf_counter()
+        if self.timings is not None:
+            self.timings.add(stage, now - start)
+        return now
+
+    def detect(self, frame, cfg, roi=None):
+        spec = cfg.detector_spec
+        if spec != self._detector_spec:
+            self._detector_spec = spec
+            self.detector = make_face_detector(spec)
+            log.info("Using %s face detector", spec[0])
+        try:
+            return self.detector.detect(frame, cfg.detection_width, roi, cfg.orientation)
+        except cv2.error as e:
+            # A bad model or params must not take the camera loop down; treat
+            # the frame as having no faces and keep streaming.
+            self._detect_log(logging.ERROR, "Face detection failed: %s", e)
+            return ()
+
+    def detection_roi(self, w_f, h_f, cfg):
+        """Pick the search window for the next detection, or None for a full scan."""
+        if not cfg.roi_detection or self.last_face is None:
+            return None
+        if self._roi_misses >= cfg.roi_max_misses:
+            return None
+        if self._scans_since_full >= cfg.roi_full_scan_every:
+            return None
+
+        x, y, w, h = self.last_face
+        face_size = max(w, h)
+        side = -(-int(face_size * ROI_SEARCH_FACTOR) // ROI_ALIGN) * ROI_ALIGN
+        if side >= min(h_f, w_f):
+            return None  # window would cover most of the frame anyway
+        x0 = min(max(0, x + w // 2 - side // 2), w_f - side)
+        y0 = min(max(0, y + h // 2 - side // 2), h_f - side)
+        return (x0, y0, side, side, face_size)
+
+    def record_detection(self, faces, roi):
+        """Update ROI bookkeeping after a detection on `roi` (None = full frame)."""
+        if roi is None:
+            self._scans_since_full = 0
+            self._roi_misses = 0
+            self.stats["detection_full_scans"] = self.stats.get("detection_full_scans", 0) + 1
+        else:
+            self._scans_since_full += 1
+            self.stats["detection_roi_scans"] = self.stats.get("detection_roi_scans", 0) + 1
+
+        if len(faces) > 0:
+            self._roi_misses = 0
+            self.last_face = tuple(int(v) for v in max(faces, key=lambda f: f[2] * f[3]))
+        elif roi is not None:
+            self._roi_misses += 1
+        else:
+            self.last_face = None
+
+    def update_smoothing(self, faces, alpha):
+        x, y, w, h = max(faces, key=lambda f: f[2] * f[3])
+        cx = x + w // 2
+        cy = y + h // 2
+        size = max(w, h)
+
+        if self.smooth_cx is None:
+            self.smooth_cx, self.smooth_cy, self.smooth_size = cx, cy, size
+            log.debug("Initialized smooth face: cx=%d cy=%d size=%d", cx, cy, size)
+        else:
+            self.smooth_cx = (1 - alpha) * self.smooth_cx + alpha * cx
+            self.smooth_cy = (1 - alpha) * self.smooth_cy + alpha * cy
+            self.smooth_size = (1 - alpha) * self.smooth_size + alpha * size
+            log.debug(
+                "Updated smooth face: cx=%.1f cy=%.1f size=%.1f",
+                self.smooth_cx, self.smooth_cy, self.smooth_size
+            )
+
+    def crop_rect(self, frame_w, frame_h, margin, aspect=1.0):
+        """Crop (x, y, w, h) around the smoothed face, in float pixels.
+
+        The crop has the output's `aspect` (w / h; square by default) and
+        its height follows the face size. Without a face yet this is the
+        largest centred crop. The crop is clamped to fit inside the frame so
+        the output never shows a border.
+        """
+        max_h = float(min(frame_h, frame_w / aspect))
+        if self.smooth_cx is None or self.smooth_cy is None or self.smooth_size is None:
+            w = max_h * aspect
+            return (frame_w - w) / 2, (frame_h - max_h) / 2, w, max_h
+
+        # Always keep the output's aspect ratio to avoid distortion, and
+        # clamp size so it fits in frame and isn't absurdly tiny
+        h = max(min(50.0, max_h), min(self.smooth_size * margin, max_h))
+        w = h * aspect
+        x1 = min(max(0.0, self.smooth_cx - w / 2), frame_w - w)
+        y1 = min(max(0.0, self.smooth_cy - h / 2), frame_h - h)
+        return x1, y1, w, h
+
+    def _apply_detection_result(self, frame_idx, timestamp, alpha):
+        """Apply the worker's newest result, if unseen; return it or None."""
+        result = self.detection_worker.latest()
+        if result is None or result.seq == self._result_seq:
+            return None
+        self._result_seq = result.seq
+        self.stats["detection_staleness_frames"] = frame_idx - result.frame_idx
+        self.stats["detection_staleness_ms"] = (timestamp - result.timestamp) * 1000.0
+        log.debug("Frame %d: detected %d face(s)", result.frame_idx, len(result.faces))
+        self.record_detection(result.faces, result.roi)
+        if len(result.faces) > 0:
+            self.update_smoothing(result.faces, alpha)
+        return result
+
+    def track(self, frame, cfg, faces, alpha):
+        """Run the configured tracker; `faces` is the detection that just finished, if any."""
+        key = (cfg.tracker, cfg.detection_width, cfg.orientation)
+        if key != self._tracker_key:
+            if self.tracker is not None:
+                self.tracker.reset()
+            self._tracker_key = key
+            self.tracker = make_tracker(*key)
+        if self.tracker is None:
+            return False
+
+        start = time.perf_counter()
+        if faces is not None and len(faces) > 0:
+            self.tracker.init(frame, self.last_face)
+        elif faces is not None and self.last_face is None:
+            self.tracker.reset()  # full-frame scan found nobody
+        else:
+            rect = self.tracker.update(frame)
+            if rect is not None:
+                self.update_smoothing([rect], alpha)
+        elapsed_ms = (time.perf_counter() - start) * 1000.0
+        prev = self.stats.get("tracker_ms")
+        self.stats["tracker_ms"] = elapsed_ms if prev is None else 0.9 * prev + 0.1 * elapsed_ms
+        self.stats["tracker_active"] = self.tracker.active
+        return True
+
+    def process(self, frame, cfg, timestamp=None, pixel_format="rgb", out_size=None):
+        """Run one captured BGR frame through the pipeline; return the output
+        frame in `pixel_format` (one of OUTPUT_FORMATS), `out_size` (w, h)
+        or cfg.output_size.
+
+        The output is a frame_pool buffer the caller releases once it has
+        been sent.
+
+        `cfg` is a ConfigSnapshot, whose typed attributes are parsed once per
+        config version rather than on every frame.
+
+        `timestamp` is the frame's capture time (time.monotonic()); it is
+        used to report how stale asynchronous detection results are.
+        """
+        begin = t = time.perf_counter()
+        if timestamp is None:
+            timestamp = time.monotonic()
+        self.frame_idx += 1
+
+        # The frame stays as captured: detection and tracking rotate their
+        # small working copies, and the compose warp folds in the rotation,
+        # so all face coordinates below are in the oriented frame.
+        orientation = cfg.orientation
+        if orientation != self._orientation:
+            self.reset()  # face coordinates from the old orientation are meaningless
+            self._orientation = orientation
+        src_size = (frame.shape[1], frame.shape[0])
+        w_f, h_f = oriented_size(*src_size, orientation)
+
+        det_n = cfg.detection_every_n_frames
+        alpha = cfg.smoothing_alpha
+        margin = cfg.margin_factor
+
+        detection_width = cfg.detection_width
+        worker = self.detection_worker if cfg.async_detection else None
+
+        faces = None
+        if worker is not None:
+            if self.frame_idx % det_n == 0:
+                roi = self.detection_roi(w_f, h_f, cfg)
+                worker.submit(
+                    frame, self.frame_idx, timestamp, cfg.detector_spec, detection_width, roi,
+                    orientation,
+                )
+                t = self._lap("detect", t)
+            result = self._apply_detection_result(self.frame_idx, timestamp, alpha)
+            if result is not None:
+                faces = result.faces
+                t = self._lap("smooth", t)
+        elif self.frame_idx % det_n == 0:
+            roi = self.detection_roi(w_f, h_f, cfg)
+            faces = self.detect(frame, cfg, roi)
+            t = self._lap("detect", t)
+            log.debug("Frame %d: detected %d face(s)", self.frame_idx, len(faces))
+            self.record_detection(faces, roi)
+            if len(faces) > 0:
+                self.update_smoothing(faces, alpha)
+                t = self._lap("smooth", t)
+
+        if self.track(frame, cfg, faces, alpha):
+            t = self._lap("track", t)
+
+        out_w, out_h = out_size or cfg.output_size
+        rect = self.crop_rect(w_f, h_f, margin, out_w / out_h)
+        matrix = crop_transform(rect, (out_w, out_h), src_size, orientation, cfg.mirror)
+        bgr = compose(frame, matrix, frame_pool.acquire((out_h, out_w, 3)))
+        t = self._lap("compose", t)
+        # warpAffine cannot change the pixel format, so conversion is a
+        # second pass, but only over the output-sized image.
+        out, conversions = convert_output(bgr, pixel_format)
+        if out is not bgr:
+            frame_pool.release(bgr)
+        self.stats["output_conversions"] = conversions
+        if conversions:
+            self._lap("convert", t)
+        self._lap("total", begin)
+        return out
+
+
+FRAME_AGE_WINDOW = 120  # frames the frame-age percentiles are computed over
+
+
+def output_target(size, fps):
+    """The output size and rate a capture mode is negotiated for, as a string."""
+    return f"{size[0]}x{size[1]}@{fps:g}"
+
+
+def cached_capture_mode(cfg, key):
+    """The cached mode for `key`, if it was negotiated for the current output."""
+    entry = (cfg.get("capture_modes") or {}).get(key) or {}
+    if entry.get("output") != output_target(cfg.output_size, cfg.output_fps):
+        return None
+    return coerce_capture_mode(entry)
 
-                if frame_idx % det_n == 0:
-                    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-                    faces = face_cascade.detectMultiScale(
-                        gray,
-                        scaleFactor=1.3,
-                        minNeighbors=5,
-                        minSize=(60, 60),
+
+def remember_capture_mode(key, mode, target):
+    """Cache the mode negotiated for `key` and output `target` in the persisted config."""
+    modes = dict(get_config_snapshot().get("capture_modes") or {})
+    modes[key] = dict(mode._asdict(), output=target)
+    update_config({"capture_modes": modes})
+
+
+def camera_loop(source_overrides=None, realtime=True, sink_kind="vcam", sink_path=None, pacing=True):
+    log.info("Starting camera_loop")
+    detection_worker = DetectionWorker().start()
+    pipeline = CropPipeline(detection_worker=detection_worker)
+    current_spec = None
+    cap = None
+    reader = None
+    opener = None        # SourceOpener for a pending switch
+    failed_spec = None   # last spec that failed to open...
+    retry_at = 0.0       # ...and when to try it again
+    lost_spec = None     # spec dropped because it stalled, until it is back
+    # Pooled frames the loop owns a reference to (see BufferPool).
+    last_output = None   # last frame sent, held while no fresh frames arrive
+    placeholder = None   # placeholder_frame() in the sink's pixel format
+    health = CaptureHealth()
+    pacer = FramePacer(FPS if pacing else None)
+    hold_pacer = FramePacer(FPS)
+    allocations = 0      # frame_pool allocations as of the previous frame
+    # Capture-to-output age of recent frames, for the latency metrics.
+    frame_ages = deque(maxlen=FRAME_AGE_WINDOW)
+    sink = None
+    sink_output = None   # ((w, h), fps, pixel_format) the sink was opened with
+
+    log.info("Initializing output sink %s (path=%s)", sink_kind, sink_path)
+
+    try:
+        while True:
+            cfg = get_config_snapshot()
+
+            # Output settings apply live: the sink is reopened, capture keeps running.
+            output = (cfg.output_size, cfg.output_fps, cfg.get("output_format", "auto"))
+            if output != sink_output:
+                first_open = sink is None
+                sink, sink_output = reopen_output(sink, sink_output, output, sink_kind, sink_path)
+                frame_pool.release(placeholder)
+                placeholder = convert_output(
+                    placeholder_frame(sink.width, sink.height), sink.pixel_format
+                )[0]
+                frame_pool.release(last_output)
+                last_output = None  # may be the old size or format
+                if pacing:
+                    pacer.fps = sink.fps
+                    pacer.reset()
+                hold_pacer.fps = sink.fps
+                hold_pacer.reset()
+                set_metrics({
+                    "output_format": sink.pixel_format,
+                    "output_size": f"{sink.width}x{sink.height}",
+                    "output_fps": sink.fps,
+                })
+                if first_open:
+                    log.info("Open http://127.0.0.1:5000 to configure.")
+                    if sink_kind == "vcam":
+                        log.info("Select this virtual camera in Zoom/Meet/etc.")
+
+            spec = frame_source_spec(cfg, source_overrides)
+            if camera_reconnect.is_set():
+                camera_reconnect.clear()
+                if spec[0] == "camera" and spec == current_spec:
+                    # The old handle died with the unplug; let go of it so
+                    # the device can be opened again below.
+                    log.info("Reconnecting %s", describe_source(spec))
+                    SourceOpener._close(cap, reader)
+                    cap = reader = current_spec = None
+                    lost_spec = spec
+                if spec[0] == "camera" and spec in (lost_spec, failed_spec):
+                    # The device is back: reopen now rather than after the
+                    # backoff built up while it was gone.
+                    failed_spec, retry_at = None, 0.0
+                    health.open_failures = 0
+
+            if opener is not None and opener.spec != spec:
+                opener.cancel()
+                opener = None
+            now = time.monotonic()
+            if (
+                opener is None
+                and spec != current_spec
+                and source_selected(spec)
+                and not (spec == failed_spec and now < retry_at)
+            ):
+                capture_key = None
+                cached_mode = None
+                if spec[0] == "camera":
+                    capture_key = capture_device_key(spec[1])
+                    cached_mode = cached_capture_mode(cfg, capture_key)
+                log.info("Opening %s in the background", describe_source(spec))
+                if spec == lost_spec:
+                    health.reopens += 1
+                opener = SourceOpener(
+                    spec, realtime=realtime, capture_key=capture_key,
+                    capture_mode=cached_mode, low_latency=cfg.low_latency,
+                    output_size=cfg.output_size, fps=cfg.output_fps,
+                )
+
+            if opener is not None and opener.done():
+                if opener.reader is None:
+                    if opener.spec != failed_spec:
+                        health.open_failures = 0
+                    health.open_failures += 1
+                    failed_spec, retry_at = opener.spec, now + health.retry_delay()
+                    health.open_log(
+                        logging.ERROR, "Failed to open %s: %s; keeping %s, retrying in %.1fs",
+                        describe_source(opener.spec), opener.error,
+                        describe_source(current_spec) if reader is not None else "the held frame",
+                        health.retry_delay(),
                     )
-                    log.debug("Frame %d: detected %d face(s)", frame_idx, len(faces))
-                    if len(faces) > 0:
-                        x, y, w, h = max(faces, key=lambda f: f[2] * f[3])
-                        cx = x + w // 2
-                        cy = y + h // 2
-                        size = max(w, h)
-
-                        if smooth_cx is None:
-                            smooth_cx, smooth_cy, smooth_size = cx, cy, size
-                            log.debug("Initialized smooth face: cx=%d cy=%d size=%d", cx, cy, size)
-                        else:
-                            smooth_cx = (1 - alpha) * smooth_cx + alpha * cx
-                            smooth_cy = (1 - alpha) * smooth_cy + alpha * cy
-                            smooth_size = (1 - alpha) * smooth_size + alpha * size
-                            log.debug(
-                                "Updated smooth face: cx=%.1f cy=%.1f size=%.1f",
-                                smooth_cx, smooth_cy, smooth_size
-                            )
-
-                h_f, w_f, _ = frame.shape
-
-                if smooth_cx is None or smooth_cy is None or smooth_size is None:
-                    # No face yet: center square crop
-                    size = min(h_f, w_f)
-                    x0 = (w_f - size) // 2
-                    y0 = (h_f - size) // 2
-                    crop = frame[y0:y0 + size, x0:x0 + size]
                 else:
-                    # Always keep a square crop to avoid aspect-ratio distortion
-                    max_square = min(h_f, w_f)
-                    desired = int(smooth_size * margin)
-                    # Clamp size so it fits in frame and isn't absurdly tiny
-                    size = max(50, min(desired, max_square))
-
-                    cx = int(round(smooth_cx))
-                    cy = int(round(smooth_cy))
-
-                    # Initial top-left
-                    x1 = cx - size // 2
-                    y1 = cy - size // 2
-
-                    # Clamp so the square fits fully inside the frame
-                    if x1 < 0:
-                        x1 = 0
-                    if y1 < 0:
-                        y1 = 0
-                    if x1 + size > w_f:
-                        x1 = w_f - size
-                    if y1 + size > h_f:
-                        y1 = h_f - size
-
-                    # Final bounds
-                    x2 = x1 + size
-                    y2 = y1 + size
-
-                    crop = frame[y1:y2, x1:x2]
-                    if crop.size == 0 or crop.shape[0] != crop.shape[1]:
+                    if current_spec is not None:
+                        log.info("Releasing previous %s", describe_source(current_spec))
+                    SourceOpener._close(cap, reader)
+                    cap, reader, current_spec = opener.cap, opener.reader, opener.spec
+                    failed_spec = lost_spec = None
+                    health.open_failures = 0
+                    pipeline.reset()
+                    frame_ages.clear()
+                    log.info(
+                        "Switched to %s (opened in %.2fs)",
+                        describe_source(current_spec), now - opener.started,
+                    )
+
+                    mode = getattr(cap, "mode", None)
+                    set_metrics({
+                        "capture_mode": format_capture_mode(mode),
+                        "capture_device": opener.capture_key,
+                        "capture_buffer_size_set": getattr(cap, "buffer_size_set", False),
+                    })
+                    if mode is not None and mode != opener.capture_mode:
+                        remember_capture_mode(
+                            opener.capture_key, mode, output_target(opener.output_size, opener.fps)
+                        )
+                opener = None
+
+            stalled_for = 0.0
+            frame = None
+            if reader is not None:
+                if hasattr(cap, "low_latency"):
+                    cap.low_latency = cfg.low_latency  # draining can change live
+                seq, captured_at, frame = reader.read(timeout=0.5)
+                set_metrics({"capture_" + k: v for k, v in reader.stats().items()})
+                now = time.monotonic()
+                stalled_for = now - (captured_at if frame is not None else reader.started_at)
+                stall_timeout = max(CAPTURE_STALL_TIMEOUT, 2.0 / cap.fps)
+
+            if reader is None or stalled_for > stall_timeout:
+                # No fresh frames: keep the output alive with the last
+                # frame sent (or a placeholder) at the output rate.
+                # A first open still in progress is starting up, not degraded;
+                # reopening a source that stalled (lost_spec) still counts.
+                starting = reader is None and opener is not None and opener.spec != lost_spec
+                if (reader is not None or source_selected(spec)) and not starting:
+                    if health.degrade(now):
                         log.warning(
-                            "Non-square or empty crop detected (%dx%d), falling back to center crop",
-                            crop.shape[1] if crop.size else -1,
-                            crop.shape[0] if crop.size else -1,
+                            "No fresh frames from %s; holding the output frame",
+                            describe_source(current_spec or spec),
                         )
-                        size = min(h_f, w_f)
-                        x0 = (w_f - size) // 2
-                        y0 = (h_f - size) // 2
-                        crop = frame[y0:y0 + size, x0:x0 + size]
-
-                crop = cv2.resize(crop, (OUT_W, OUT_H))
-                rgb = cv2.cvtColor(crop, cv2.COLOR_BGR2RGB)
-                vcam.send(rgb)
-                vcam.sleep_until_next_frame()
+                if reader is not None and (
+                    reader.consecutive_failures >= CAPTURE_REOPEN_FAILURES
+                    or stalled_for > max(CAPTURE_REOPEN_STALL, 3 * stall_timeout)
+                ):
+                    log.warning(
+                        "Reopening %s after %d failed reads, %.1fs without a frame",
+                        describe_source(current_spec), reader.consecutive_failures, stalled_for,
+                    )
+                    SourceOpener._close(cap, reader)
+                    cap = reader = None
+                    lost_spec, current_spec, failed_spec = current_spec, None, None
+                frame_pool.release(frame)
+                sink.send(last_output if last_output is not None else placeholder)
+                hold_pacer.wait()
+                set_metrics(health.stats(now))
+                set_metrics({"frames_sent": sink.frames_sent})
+                continue
+
+            if health.degraded:
+                log.info(
+                    "%s recovered after %.1fs degraded",
+                    describe_source(current_spec), health.recover(now),
+                )
+
+            out = pipeline.process(
+                frame, cfg, timestamp=captured_at, pixel_format=sink.pixel_format,
+                out_size=(sink.width, sink.height),
+            )
+            frame_pool.release(frame)
+            sink.send(out)
+            frame_pool.release(last_output)
+            last_output = out
+            frame_ages.append(time.monotonic() - captured_at)
+            pacer.wait()
+            set_metrics({"detection_" + k: v for k, v in detection_worker.stats().items()})
+            set_metrics(pipeline.stats)
+            set_metrics(health.stats(now))
+            pool_stats = frame_pool.stats()
+            set_metrics({"buffer_" + k: v for k, v in pool_stats.items()})
+            set_metrics({"buffer_allocations_last_frame": pool_stats["allocations"] - allocations})
+            allocations = pool_stats["allocations"]
+            age_p50, age_p95 = np.percentile(frame_ages, [50, 95]) * 1000.0
+            set_metrics({
+                "frames_sent": sink.frames_sent,
+                "pacer_overruns": pacer.overruns,
+                "frame_age_ms": round(frame_ages[-1] * 1000.0, 1),
+                "frame_age_p50_ms": round(float(age_p50), 1),
+                "frame_age_p95_ms": round(float(age_p95), 1),
+            })
     except KeyboardInterrupt:
         log.info("KeyboardInterrupt: exiting camera_loop")
     except Exception:
         log.exception("Unhandled exception in camera_loop")
     finally:
+        detection_worker.stop()
+        if sink is not None:
+            sink.close()
+        if opener is not None:
+            opener.cancel()
+        if reader is not None:
+            reader.stop()
         if cap is not None:
             log.info("Releasing capture device on exit")
             cap.release()
         log.info("camera_loop finished")
 
+# ==========================
+# Benchmark
+# ==========================
+BENCH_STAGES = ("detect", "smooth", "track", "compose", "convert", "send", "total")
+
+
+def parse_resolution(text):
+    w, _, h = text.lower().partition("x")
+    return int(w), int(h)
+
+def open_bench_source(kind, path, width, height):
+    if kind == "synthetic":
+        return SyntheticSource(width=width, height=height, realtime=False)
+    source = open_frame_source(kind, path=path, realtime=False)
+    if source is None or not source.isOpened():
+        raise ValueError(f"Cannot open {kind} source {path!r} for benchmarking")
+    return source
+
+def bench_run(kind, path, width, height, det_n, detector, frames, warmup, output_format="auto",
+              output_size=None):
+    """Drive the crop pipeline into a null sink as fast as possible."""
+    cfg = get_config_snapshot().replace(detection_every_n_frames=det_n, detector=detector)
+    out_w, out_h = output_size or cfg.output_size
+    timings = StageTimings()
+    pipeline = CropPipeline(timings=timings)
+    source = open_bench_source(kind, path, width, height)
+    try:
+        with NullSink(out_w, out_h, cfg.output_fps, output_format) as sink:
+            elapsed = 0.0
+            for i in range(warmup + frames):
+                buf = frame_pool.acquire((height, width, 3))
+                ret, frame = source.read(buf)
+                if not ret:
+                    raise RuntimeError(f"{kind} source ran out of frames")
+                if frame.shape[1] != width or frame.shape[0] != height:
+                    frame = cv2.resize(frame, (width, height))
+                if i == warmup:
+                    timings.samples.clear()
+                    elapsed = 0.0
+                    allocations = frame_pool.allocations
+                begin = time.perf_counter()
+                out = pipeline.process(
+                    frame, cfg, pixel_format=sink.pixel_format, out_size=(out_w, out_h)
+                )
+                t = time.perf_counter()
+                sink.send(out)
+                timings.add("send", time.perf_counter() - t)
+                elapsed += time.perf_counter() - begin
+                frame_pool.release(out)
+                frame_pool.release(buf)  # `frame` is either buf or not pooled
+    finally:
+        source.release()
+
+    return {
+        "source": kind,
+        "resolution": f"{width}x{height}",
+        "output": f"{out_w}x{out_h}",
+        "detection_every_n_frames": det_n,
+        "detector": detector,
+        "frames": frames,
+        "fps": frames / elapsed if elapsed > 0 else None,
+        "buffer_allocations_per_frame": (frame_pool.allocations - allocations) / frames,
+        "output_conversions": list(pipeline.stats.get("output_conversions", ())),
+        "stages": timings.summary(),
+    }
+
+def print_bench_run(run):
+    print(
+        f"\n{run['source']} {run['resolution']} -> {run['output']} "
+        f"det_n={run['detection_every_n_frames']} "
+        f"detector={run['detector']}: "
+        f"{run['fps']:.1f} fps over {run['frames']} frames, "
+        f"{run['buffer_allocations_per_frame']:.2f} buffer allocations/frame"
+    )
+    print(f"  {'stage':<8} {'count':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for stage in BENCH_STAGES:
+        st = run["stages"].get(stage)
+        if st is None:
+            continue
+        print(
+            f"  {stage:<8} {st['count']:>6} {st['p50_ms']:>8.3f} "
+            f"{st['p95_ms']:>8.3f} {st['p99_ms']:>8.3f}"
+        )
+
+def run_bench(args):
+    # Per-frame debug logging would dominate the numbers.
+    log.setLevel(logging.INFO)
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "python": platform.python_version(),
+        "opencv": cv2.__version__,
+        "output_format": args.output_format,
+        "runs": [],
+    }
+    detectors = args.detectors.split(",") if args.detectors else [get_config()["detector"]]
+    for detector in detectors:
+        if detector not in DETECTORS:
+            raise SystemExit(f"Unknown detector {detector!r}; choose from {', '.join(DETECTORS)}")
+    usable = []
+    for detector in detectors:
+        name, params = get_config_snapshot().replace(detector=detector).detector_spec
+        try:
+            DETECTOR_CLASSES[name](dict(params))
+        except (ValueError, cv2.error) as e:
+            log.warning("Skipping %s detector: %s", detector, e)
+            continue
+        usable.append(detector)
+
+    if args.output_sizes:
+        output_sizes = [parse_resolution(size) for size in args.output_sizes.split(",")]
+    else:
+        output_sizes = [get_config_snapshot().output_size]
+
+    for detector in usable:
+        for res in args.resolutions.split(","):
+            width, height = parse_resolution(res)
+            for output_size in output_sizes:
+                for det_n in (int(n) for n in args.det_n.split(",")):
+                    run = bench_run(
+                        args.source, args.source_path, width, height, det_n, detector,
+                        args.frames, args.warmup, args.output_format, output_size,
+                    )
+                    report["runs"].append(run)
+                    print_bench_run(run)
+
+    if args.json:
+        text = json.dumps(report, indent=2)
+        if args.json == "-":
+            print(text)
+        else:
+            Path(args.json).write_text(text, encoding="utf-8")
+            log.info("Wrote benchmark report to %s", args.json)
+    return report
+
 def run_flask():
     log.info("Starting Flask server on http://127.0.0.1:5000")
-    app.run(host="127.0.0.1", port=5000, debug=False, use_reloader=False)
+    # Per-request access logs cost more than the requests themselves.
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    app.run(host="127.0.0.1", port=5000, debug=False, use_reloader=False, threaded=True)
 
-def main():
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="FaceCam: face-tracking virtual webcam")
+    parser.add_argument(
+        "--source", choices=FRAME_SOURCES,
+        help="frame source to use instead of the configured one",
+    )
+    parser.add_argument(
+        "--source-path",
+        help="video file (--source file) or image directory (--source images)",
+    )
+    parser.add_argument(
+        "--as-fast-as-possible", dest="realtime", action="store_false",
+        help="don't pace file/image/synthetic sources to real time",
+    )
+    parser.add_argument(
+        "--sink", choices=OUTPUT_SINKS, default="vcam",
+        help="where to send output frames (default: virtual camera)",
+    )
+    parser.add_argument(
+        "--sink-path",
+        help="output file (--sink file) or shared memory name (--sink shm)",
+    )
+    parser.add_argument(
+        "--no-pacing", dest="pacing", action="store_false",
+        help="send output frames as fast as the pipeline produces them",
+    )
+
+    subparsers = parser.add_subparsers(dest="command")
+    bench = subparsers.add_parser(
+        "bench", help="measure crop pipeline throughput and per-stage latency headlessly",
+    )
+    bench.add_argument(
+        "--source", choices=("synthetic", "file", "images"), default="synthetic",
+        help="input frames for the benchmark (default: synthetic)",
+    )
+    bench.add_argument("--source-path", help="video file or image directory")
+    bench.add_argument(
+        "--resolutions", default="640x480,1280x720,1920x1080",
+        help="comma-separated input resolutions (WxH)",
+    )
+    bench.add_argument(
+        "--det-n", default="1,5,10",
+        help="comma-separated detection_every_n_frames values",
+    )
+    bench.add_argument(
+        "--detectors", help="comma-separated detector backends (default: the configured one)",
+    )
+    bench.add_argument(
+        "--output-sizes",
+        help="comma-separated output sizes (WxH, default: the configured output size)",
+    )
+    bench.add_argument(
+        "--output-format", choices=("auto",) + OUTPUT_FORMATS, default="auto",
+        help="pixel format the pipeline produces (default: the null sink's native BGR)",
+    )
+    bench.add_argument("--frames", type=int, default=300, help="timed frames per run")
+    bench.add_argument("--warmup", type=int, default=30, help="untimed frames per run")
+    bench.add_argument("--json", help="write the JSON report to this path ('-' for stdout)")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.command == "bench":
+        run_bench(args)
+        return
     log.info("FaceCam starting up (platform=%s)", platform.system())
+    forget_loopback_camera_index()
+    camera_registry.refresh()
+    watcher = None
+    if platform.system() == "Linux":
+        watcher = DeviceWatcher(handle_hotplug).start()
     t = threading.Thread(target=run_flask, daemon=True, name="FlaskThread")
     t.start()
-    camera_loop()
+    overrides = {"source": args.source, "source_path": args.source_path}
+    try:
+        camera_loop(
+            source_overrides=overrides,
+            realtime=args.realtime,
+            sink_kind=args.sink,
+            sink_path=args.sink_path,
+            pacing=args.pacing,
+        )
+    finally:
+        if watcher is not None:
+            watcher.stop()
+        config_persister.flush()
 
 if __name__ == "__main__":
     main()
@@ -21,6 +21,6 @@ if not exist ".venv" (
 )
 
 echo [FaceCam] Starting FaceCam...
-python main.py
+python main.py %*
 
 endlocal
@@ -22,4 +22,4 @@ if [ ! -d "$SCRIPT_DIR/.venv" ]; then
 fi
 
 echo "[facecam] Starting..."
-"$SCRIPT_DIR/.venv/bin/python" "$SCRIPT_DIR/main.py"
+"$SCRIPT_DIR/.venv/bin/python" "$SCRIPT_DIR/main.py" "$@"
@@ -0,0 +1,69 @@
+"""Camera hotplug: DeviceWatcher on a temp directory standing in for /dev."""
+import queue
+
+import pytest
+
+import main
+
+
+def watch(dev_root):
+    changes = queue.Queue()
+    watcher = main.DeviceWatcher(
+        lambda added, removed: changes.put((added, removed)),
+        dev_root=dev_root, poll_interval=0.05,
+    )
+    return watcher.start(), changes
+
+
+@pytest.fixture
+def dev_root(tmp_path):
+    (tmp_path / "video0").touch()
+    (tmp_path / "null").touch()
+    return tmp_path
+
+
+@pytest.fixture(params=["poll", "inotify"])
+def mode(request, monkeypatch):
+    if request.param == "poll":
+        monkeypatch.setattr(main.DeviceWatcher, "_init_inotify", lambda self: False)
+    monkeypatch.setattr(main, "HOTPLUG_SETTLE", 0.0)
+    return request.param
+
+
+def test_watcher_reports_added_and_removed_nodes(dev_root, mode):
+    watcher, changes = watch(dev_root)
+    try:
+        if watcher.mode != mode:
+            pytest.skip(f"{mode} is not available here")
+        (dev_root / "video2").touch()
+        assert changes.get(timeout=5) == ({2}, set())
+        (dev_root / "video0").unlink()
+        assert changes.get(timeout=5) == (set(), {0})
+        # Other device nodes are not cameras.
+        (dev_root / "media0").touch()
+        (dev_root / "video4").touch()
+        assert changes.get(timeout=5) == ({4}, set())
+        assert changes.empty()
+    finally:
+        watcher.stop()
+
+
+@pytest.fixture
+def selected_camera(monkeypatch):
+    snapshot = main.get_config_snapshot().replace(camera_index=2)
+    monkeypatch.setattr(main, "get_config_snapshot", lambda: snapshot)
+    monkeypatch.setattr(main.camera_registry, "update_devices", lambda added, removed: [])
+    main.camera_reconnect.clear()
+    yield 2
+    main.camera_reconnect.clear()
+
+
+def test_hotplug_reconnects_the_selected_camera(selected_camera):
+    main.handle_hotplug({selected_camera}, set())
+    assert main.camera_reconnect.is_set()
+
+
+def test_hotplug_ignores_other_cameras(selected_camera):
+    main.handle_hotplug({selected_camera + 1}, set())
+    main.handle_hotplug(set(), {selected_camera})
+    assert not main.camera_reconnect.is_set()
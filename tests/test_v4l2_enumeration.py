@@ -0,0 +1,121 @@
+"""V4L2 enumeration against a fake sysfs tree, without real devices."""
+import pytest
+
+import main
+
+
+def add_node(sysfs, index, name, driver=None, node_index=0):
+    node = sysfs / f"video{index}"
+    node.mkdir()
+    (node / "name").write_text(name + "\n")
+    (node / "index").write_text(f"{node_index}\n")
+    if driver is not None:
+        driver_dir = sysfs.parent / "drivers" / driver
+        driver_dir.mkdir(parents=True, exist_ok=True)
+        (node / "device").mkdir()
+        (node / "device" / "driver").symlink_to(driver_dir)
+
+
+def no_querycap(path):
+    return None
+
+
+@pytest.fixture
+def roots(tmp_path):
+    sysfs = tmp_path / "video4linux"
+    sysfs.mkdir()
+    dev = tmp_path / "dev"
+    dev.mkdir()
+    return sysfs, dev
+
+
+@pytest.fixture
+def uvc_and_loopback(roots):
+    sysfs, dev = roots
+    add_node(sysfs, 0, "HD Webcam", driver="uvcvideo")
+    add_node(sysfs, 1, "HD Webcam", driver="uvcvideo", node_index=1)  # metadata node
+    add_node(sysfs, 4, "FaceCam", driver="v4l2 loopback")
+    return sysfs, dev
+
+
+def test_uvc_metadata_node_is_not_a_capture_node(uvc_and_loopback):
+    devices = {d["index"]: d for d in main.enumerate_v4l2_devices(*uvc_and_loopback, no_querycap)}
+    assert sorted(devices) == [0, 1, 4]
+    assert devices[0]["capture"] and not devices[0]["loopback"]
+    assert devices[0]["driver"] == "uvcvideo"
+    assert not devices[1]["capture"]
+
+
+def test_loopback_found_by_driver_link(uvc_and_loopback):
+    sysfs, dev = uvc_and_loopback
+    devices = {d["index"]: d for d in main.enumerate_v4l2_devices(sysfs, dev, no_querycap)}
+    assert devices[4]["loopback"]
+    assert main.find_loopback_device(sysfs, dev, no_querycap) == str(dev / "video4")
+
+
+def test_only_real_cameras_are_listed(uvc_and_loopback):
+    assert main.list_cameras_sysfs(None, 10, *uvc_and_loopback) == [0]
+
+
+def test_loopback_found_by_querycap(roots):
+    sysfs, dev = roots
+    add_node(sysfs, 0, "HD Webcam")
+    add_node(sysfs, 2, "Dummy video device")
+
+    def querycap(path):
+        if path.name == "video2":
+            caps = main.V4L2_CAP_VIDEO_CAPTURE | main.V4L2_CAP_VIDEO_OUTPUT
+            return {"driver": "v4l2 loopback", "card": "Dummy video device", "caps": caps}
+        return {"driver": "uvcvideo", "card": "HD Webcam", "caps": main.V4L2_CAP_VIDEO_CAPTURE}
+
+    devices = {d["index"]: d for d in main.enumerate_v4l2_devices(sysfs, dev, querycap)}
+    assert not devices[0]["loopback"] and devices[0]["capture"]
+    assert devices[2]["loopback"] and devices[2]["driver"] == "v4l2 loopback"
+    assert main.find_loopback_device(sysfs, dev, querycap) == str(dev / "video2")
+
+
+def test_no_loopback_device(roots):
+    sysfs, dev = roots
+    add_node(sysfs, 0, "HD Webcam", driver="uvcvideo")
+    assert main.find_loopback_device(sysfs, dev, no_querycap) is None
+
+
+@pytest.fixture
+def persisted_index_0(monkeypatch):
+    snapshot = main.get_config_snapshot().replace(camera_index=0)
+    updates = []
+    monkeypatch.setattr(main.platform, "system", lambda: "Linux")
+    monkeypatch.setattr(main, "get_config_snapshot", lambda: snapshot)
+    monkeypatch.setattr(main, "update_config", updates.append)
+    return updates
+
+
+def test_real_camera_at_index_0_is_kept(roots, persisted_index_0):
+    sysfs, dev = roots
+    add_node(sysfs, 0, "HD Webcam", driver="uvcvideo")
+    add_node(sysfs, 4, "FaceCam", driver="v4l2 loopback")
+    main.forget_loopback_camera_index(sysfs, dev, no_querycap)
+    assert persisted_index_0 == []
+
+
+def test_loopback_at_index_0_is_forgotten(roots, persisted_index_0):
+    sysfs, dev = roots
+    add_node(sysfs, 0, "FaceCam", driver="v4l2 loopback")
+    main.forget_loopback_camera_index(sysfs, dev, no_querycap)
+    assert persisted_index_0 == [{"camera_index": None}]
+
+
+def test_index_0_is_forgotten_without_sysfs(tmp_path, persisted_index_0):
+    main.forget_loopback_camera_index(tmp_path / "missing", tmp_path, no_querycap)
+    assert persisted_index_0 == [{"camera_index": None}]
+
+
+def test_replugged_camera_keeps_its_name(roots, monkeypatch):
+    sysfs, dev = roots
+    monkeypatch.setattr(main, "_device_probes", {})
+    monkeypatch.setattr(main.platform, "system", lambda: "Linux")
+    add_node(sysfs, 2, "HD Webcam", driver="uvcvideo")
+    add_node(sysfs, 4, "FaceCam", driver="v4l2 loopback")
+    assert main.check_cameras([2, 4], sysfs, dev) == [2]
+    assert main.capture_device_key(2) == "2:HD Webcam"
+    assert main.camera_probe_details()["4"]["loopback"]